@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Size and CPU time of the SCPI channel list codecs, compared with the
+original (uncompressed, multi-pass) implementation::
+
+    $ python benchmarks/bench_codecs.py
+
+``N`` ports are split in ``N/2`` inputs cross-connected to ``N/2`` outputs,
+in order (``contig``) or randomly (``shuffled``).
+"""
+import random
+import timeit
+
+from devicecontrol.polatis import _decode, _encode, _encode_list
+
+SIZES = (16, 192, 384)
+NUMBER = 2000
+ROW = "{:4d}  {:8s} {:5d}B -> {:4d}B  {:6.1f} -> {:6.1f}  {:6.1f} -> {:6.1f}"
+
+
+def _reference_sort_pairs(connection_map):
+    connections = ((int(k), int(v)) for k, v in (connection_map or {}).items())
+    return dict([sorted(pair) for pair in connections])
+
+
+def _reference_encode(connection_map):
+    connection_map = _reference_sort_pairs(connection_map)
+    in_ports = map(str, connection_map.keys())
+    out_ports = map(str, connection_map.values())
+    return "(@{}),(@{})".format(",".join(in_ports), ",".join(out_ports))
+
+
+def _reference_decode(message):
+    in_ports, out_ports = [
+        [int(port.strip(" \t")) for port in part.strip("(@)").split(",") if port]
+        for part in message.split("),(")
+    ]
+    return dict(zip(in_ports, out_ports))
+
+
+def _reference_encode_list(port_list):
+    return "(@{})".format(",".join(map(str, port_list)))
+
+
+def _us(function, *args):
+    """Microseconds per call"""
+    return timeit.timeit(lambda: function(*args), number=NUMBER) / NUMBER * 1e6
+
+
+def _connection_maps(size):
+    inputs = list(range(1, size // 2 + 1))
+    outputs = [i + size // 2 for i in inputs]
+    yield "contig", dict(zip(inputs, outputs))
+    shuffled = random.Random(size).sample(outputs, len(outputs))
+    yield "shuffled", dict(zip(inputs, shuffled))
+
+
+def main():
+    print("   N  map       message         encode (us)       decode (us)")
+    for size in SIZES:
+        for name, connection_map in _connection_maps(size):
+            old, new = _reference_encode(connection_map), _encode(connection_map)
+            assert _decode(new) == _reference_decode(old) == connection_map
+            print(
+                ROW.format(
+                    size,
+                    name,
+                    len(old),
+                    len(new),
+                    _us(_reference_encode, connection_map),
+                    _us(_encode, connection_map),
+                    _us(_reference_decode, old),
+                    _us(_decode, new),
+                )
+            )
+
+    print()
+    print("   N  port list       encode (us)")
+    for size in SIZES:
+        ports = list(range(1, size + 1))
+        old, new = _reference_encode_list(ports), _encode_list(ports)
+        print(
+            "{:4d}  {:5d}B -> {:3d}B  {:6.1f} -> {:6.1f}".format(
+                size,
+                len(old),
+                len(new),
+                _us(_reference_encode_list, ports),
+                _us(_encode_list, ports),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
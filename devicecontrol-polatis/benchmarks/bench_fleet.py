@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Snapshot of the cross-connects of many simulated devices, one after the
+other against :obj:`~devicecontrol.polatis.fleet.OxcFleet`::
+
+    $ python benchmarks/bench_fleet.py [--count 40] [--latency 0.02]
+"""
+import argparse
+from time import perf_counter
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.fleet import OxcFleet
+from devicecontrol.polatis.sim import SimulatorThread
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=40, help="number of devices")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--workers", type=int, default=40, help="fleet workers")
+    args = parser.parse_args(args)
+
+    with SimulatorThread(count=args.count, latency=args.latency) as simulators:
+        oxcs = [Oxc(*address, transport="buffered") for address in simulators.addresses]
+        for oxc in oxcs:
+            oxc.sync()  # Connections are opened before timing
+
+        start = perf_counter()
+        sequential = [oxc.connections for oxc in oxcs]
+        elapsed_sequential = perf_counter() - start
+
+        with OxcFleet(oxcs, max_workers=args.workers) as fleet:
+            snapshot = fleet.connections()
+        assert not snapshot.errors and len(snapshot.results) == len(sequential)
+
+        for oxc in oxcs:
+            oxc.close()
+
+    print("{} devices, {:.0f} ms latency".format(args.count, args.latency * 1000))
+    print("  sequential loop over connections  {:.3f} s".format(elapsed_sequential))
+    print(
+        "  fleet.connections() ({} workers)  {:.3f} s".format(
+            args.workers, snapshot.elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
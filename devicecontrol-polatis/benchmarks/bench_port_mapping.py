@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Translations of :obj:`~devicecontrol.polatis.slicing.PortMapping` for a
+192x192 slice (shuffled ports) of a 384x384 device, compared with the
+original implementation based on list lookups::
+
+    $ python benchmarks/bench_port_mapping.py
+"""
+import random
+import timeit
+
+from devicecontrol.polatis.slicing import (
+    PortMapping,
+    partition,
+    validate_port_in,
+)
+
+NUMBER = 200
+
+
+class ListPortMapping(PortMapping):
+    """Original implementation: linear scans of the port lists"""
+
+    def virtual_input(self, port):
+        port = int(port)
+        validate_port_in("input", port, self._input_ports)
+        return self._input_ports.index(port) + 1
+
+    def virtual_output(self, port):
+        port = int(port)
+        validate_port_in("output", port, self._output_ports)
+        return self._output_ports.index(port) + self.first_output
+
+    def virtual_port(self, port):
+        port = int(port)
+        if port in self._input_ports:
+            return self.virtual_input(port)
+        return self.virtual_output(port)
+
+    def has_pair(self, port_in, port_out):
+        return int(port_in) in self._input_ports and int(port_out) in self._output_ports
+
+    def filter_connections(self, connections):
+        own, others = partition(lambda c: self.has_pair(*c), dict(connections).items())
+        return dict(own), dict(others)
+
+    def filter_real_ports(self, ports):
+        plist = (int(p) for p in ports)
+        return (p for p in plist if p in self._input_ports or p in self._output_ports)
+
+    def virtual_connections(self, connections):
+        own, _ = self.filter_connections(connections)
+        return {
+            self.virtual_input(port_in): self.virtual_output(port_out)
+            for port_in, port_out in own.items()
+        }
+
+
+def _ms(function):
+    """Milliseconds per call"""
+    return timeit.timeit(function, number=NUMBER) / NUMBER * 1000
+
+
+def main():
+    rand = random.Random(1)
+    inputs = rand.sample(range(1, 385), 192)
+    outputs = rand.sample(range(385, 769), 192)
+    new, old = PortMapping(inputs, outputs), ListPortMapping(inputs, outputs)
+
+    # All the inputs of the device cross-connected, half of them in the slice
+    connections = dict(zip(range(1, 385), rand.sample(range(385, 769), 384)))
+    power = {port: -30.0 for port in range(1, 769)}
+    virtual_connections = new.virtual_connections(connections)
+    assert old.virtual_connections(connections) == virtual_connections
+
+    def old_power():
+        real_ports = old.filter_real_ports(power.keys())
+        return {old.virtual_port(k): power[k] for k in real_ports}
+
+    def round_trip(mapping):
+        return [mapping.virtual_port(mapping.real_port(p)) for p in range(1, 385)]
+
+    assert old_power() == new.virtual_values(power)
+    cases = [
+        (
+            "virtual_connections (384)",
+            lambda: old.virtual_connections(connections),
+            lambda: new.virtual_connections(connections),
+        ),
+        (
+            "power translation (768 ports)",
+            old_power,
+            lambda: new.virtual_values(power),
+        ),
+        (
+            "real->virtual round trip (384)",
+            lambda: round_trip(old),
+            lambda: round_trip(new),
+        ),
+        (
+            "real_connections (192)",
+            lambda: old.real_connections(virtual_connections),
+            lambda: new.real_connections(virtual_connections),
+        ),
+    ]
+    print("                                 before (ms)  after (ms)")
+    for name, before, after in cases:
+        print("  {:30s} {:8.2f} {:11.2f}".format(name, _ms(before), _ms(after)))
+
+
+if __name__ == "__main__":
+    main()
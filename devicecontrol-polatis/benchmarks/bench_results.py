@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Memory used by the compact results (:obj:`~devicecontrol.polatis.results`)
+against the dicts returned by default::
+
+    $ python benchmarks/bench_results.py
+"""
+import pickle
+import random
+import tracemalloc
+
+from devicecontrol.polatis.results import ConnectionArray, PortArray
+
+COPIES = 100
+
+
+def _allocated(factory):
+    """Mean number of bytes allocated by each object built by ``factory``"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(COPIES)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return total / COPIES
+
+
+def main():
+    rand = random.Random(1)
+    ports = list(range(1, 385))
+    levels = [round(rand.uniform(-60, -2), 2) for _ in ports]
+    # Parsed from text, like the responses of the device, so no float is shared
+    texts = [str(level) for level in levels]
+    connections = dict(zip(range(1, 193), rand.sample(range(193, 385), 192)))
+    port_texts = {str(i): str(o) for i, o in connections.items()}
+
+    cases = [
+        (
+            "384 power levels",
+            lambda: dict(zip(ports, map(float, texts))),
+            lambda: PortArray.from_ports(ports, map(float, texts)),
+        ),
+        (
+            "192 connections",
+            lambda: {int(i): int(o) for i, o in port_texts.items()},
+            lambda: ConnectionArray.from_mapping(
+                {int(i): int(o) for i, o in port_texts.items()}
+            ),
+        ),
+    ]
+    print("                     dict (kB)   compact (kB)")
+    for name, as_dict, as_compact in cases:
+        print(
+            "{:18s} {:10.1f} {:14.1f}".format(
+                name, _allocated(as_dict) / 1000, _allocated(as_compact) / 1000
+            )
+        )
+
+    power = PortArray.from_ports(ports, levels)
+    print()
+    print("Serialized 384 power levels (bytes)")
+    print("  pickle.dumps(dict)    {}".format(len(pickle.dumps(dict(power)))))
+    print("  PortArray.to_bytes()  {}".format(len(power.to_bytes())))
+
+
+if __name__ == "__main__":
+    main()
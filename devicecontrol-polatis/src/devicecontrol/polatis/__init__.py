@@ -4,12 +4,21 @@
 the Polatis Optical Cross-conector
 """
 import re
-from functools import lru_cache
+import threading
+from array import array
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
 from itertools import chain
+from time import monotonic
+
 from pkg_resources import DistributionNotFound, get_distribution
 
 from .interface import OxcInterface
-from .scpi import ScpiInterface
+from .metadata import METADATA_CACHE
+from .results import ConnectionArray, PortArray
+from .scpi import ScpiBatch, ScpiInterface
 
 try:
     # Change here if project is renamed and does not equal the package name
@@ -25,46 +34,124 @@ PORT_NUMBER_REGEX = re.compile(r"-(\d+)x(\d+)-", re.I)
 _MAX_POWER_READINGS = 256
 _PROD_CODE_WITH_INPUT_PHOTODETECTORS = ["N-VST-192x192-LU1-DMHNV-801"]
 
+ConnectionChanges = namedtuple("ConnectionChanges", "added removed unchanged")
+ConnectionChanges.__doc__ = """Report of the cross-connects touched by
+``Oxc.apply_connections``: dicts with the cross-connects ``added`` to,
+``removed`` from and kept ``unchanged`` on the device
+"""
+
 
 class Oxc(ScpiInterface, OxcInterface):
-    """Interacts with a Polatis Optical Cross Connector using SCPI"""
+    """Interacts with a Polatis Optical Cross Connector using SCPI
+
+    Arguments
+    ---------
+    cache_ttl : float
+        (Optional) When given, a local mirror of the cross-connects is kept
+        and updated by ``connect``, ``disconnect``, ``disconnect_all`` and
+        ``connections =``. Reading ``connections`` re-queries the device only
+        when the mirror is older than ``cache_ttl`` seconds (or on
+        ``refresh``). ``None`` by default (no caching).
+    minimal_diff : bool
+        (Optional) When ``True``, assigning ``connections`` uses
+        ``apply_connections`` instead of replacing all the cross-connects.
+    power_sessions : int
+        (Optional) Number of SCPI sessions used for reading power levels.
+        When greater than 1, the chunks of large power sweeps are spread over
+        extra sessions, opened on demand, if the device accepts several
+        concurrent connections. 1 by default.
+    compact_results : bool
+        (Optional) When ``True``, ``connections`` returns a
+        :obj:`~.results.ConnectionArray` and ``get_power``/``power`` return a
+        :obj:`~.results.PortArray` instead of dicts. Both are read-only
+        mappings backed by arrays, using much less memory.
+    metadata_cache : MetadataCache
+        (Optional) :obj:`~.metadata.MetadataCache` shared with other
+        instances (and possibly persisted), where the product code and number
+        of ports are looked up before querying the device. The in-memory
+        :obj:`~.metadata.METADATA_CACHE` of the process by default, ``False``
+        disables the cache.
+
+    The remaining arguments are the same as in :obj:`~.scpi.ScpiInterface`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        cache_ttl=None,
+        minimal_diff=False,
+        power_sessions=1,
+        compact_results=False,
+        metadata_cache=None,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self._cache = None if cache_ttl is None else _ConnectionCache(cache_ttl)
+        self._minimal_diff = minimal_diff
+        self._power_sessions = max(1, power_sessions)
+        self._power_lanes = []  # Extra sessions for power readings
+        self._power_lock = threading.Lock()
+        self._power_executor = None
+        self._compact_results = compact_results
+        if metadata_cache is None:
+            metadata_cache = METADATA_CACHE
+        self._metadata_cache = metadata_cache
+        self._metadata = None
+
+    @property
+    def metadata(self):
+        """Dict with the static information of the device (``idn``,
+        ``product_code`` and ``number_of_ports``), retrieved just once
+        """
+        if self._metadata is None:
+            cache = self._metadata_cache
+            metadata = cache.get(self.address) if cache else None
+            if metadata is None:
+                idn = self.idn
+                metadata = {
+                    "idn": list(idn),
+                    "product_code": idn[1],
+                    "number_of_ports": _parse_number_of_ports(idn[1]),
+                }
+                if cache:
+                    cache.store(self.address, metadata)
+            self._metadata = metadata
+        return self._metadata
 
     @property
-    @lru_cache(1)
     def product_code(self):
-        return self.idn[1]
+        return self.metadata["product_code"]
 
     @property
-    @lru_cache(1)
     def number_of_ports(self):
         """Returns a tuple with the number of inputs and output ports
         respectively"""
-        match = PORT_NUMBER_REGEX.findall(self.product_code)
-        if not match:
+        number_of_ports = self.metadata["number_of_ports"]
+        if not number_of_ports:
             msg = "Device {}:{} {} does not seem to be a Polatis OXC".format(
                 *self.address, self.idn
             )
             self._logger.debug(msg)
             raise SystemError(msg)
-        return (int(match[0][0]), int(match[0][1]))
+        return tuple(number_of_ports)
 
     @property
     def ports(self):
         """Tuple (list of "input" ports, list of "output" ports)"""
-        num = self.number_of_ports
-        return (list(range(1, num[0] + 1)), list(range(num[0] + 1, sum(num) + 1)))
+        return _ports(self.number_of_ports)
 
     @property
     def network_config(self):
         """Retrieve a dict with the device network configuration"""
-        response = self.query(":syst:comm:netw:addr?")
-        pairs = (pair.split("=") for pair in response.split())
-        return {key.strip(" \t"): value.strip('" \t') for key, value in pairs}
+        return _decode_network_config(self.query(":syst:comm:netw:addr?"))
 
     @property
     def connections(self):
         """Retrieve a dict representing all the active cross-connects"""
-        return _decode(self.query("oxc:swit:conn:stat?"))
+        connections = self._cache.get() if self._cache else None
+        if connections is None:
+            connections = self.refresh()
+        return self._connection_result(connections)
 
     @connections.setter
     def connections(self, connection_map):
@@ -72,29 +159,196 @@ class Oxc(ScpiInterface, OxcInterface):
 
         Equivalent to ``disconnect_all`` + ``connect``
         """
-        return self.command("oxc:swit:conn:only " + _encode(connection_map))
+        if self._minimal_diff:
+            self.apply_connections(connection_map)
+            return
+        with self._write_through("only", connection_map):
+            return self.command("oxc:swit:conn:only " + _encode(connection_map))
+
+    def apply_connections(self, connection_map):
+        """Replace all the previous cross-connects with a new configuration,
+        touching just the cross-connects that actually change.
+
+        The current configuration is read from the device (or from the local
+        mirror in cached mode), and the difference is sent as at most one
+        ``sub`` and one ``add`` message, in a single burst.
+        Returns a :obj:`ConnectionChanges` report.
+        """
+        target = _sort_pairs(connection_map)
+        current = self.connections
+        removed = {i: o for i, o in current.items() if target.get(i) != o}
+        added = {i: o for i, o in target.items() if current.get(i) != o}
+        unchanged = {i: o for i, o in target.items() if current.get(i) == o}
+
+        if removed or added:
+            with self.batch() as batch:
+                batch.disconnect(removed)
+                batch.connect(added)
+
+        return ConnectionChanges(added, removed, unchanged)
+
+    def refresh(self):
+        """Retrieve the active cross-connects from the device, updating the
+        local mirror (in cached mode)
+        """
+        if not self._cache:
+            return _decode(self.query("oxc:swit:conn:stat?"))
+        with self._cache.lock:
+            connections = _decode(self.query("oxc:swit:conn:stat?"))
+            self._cache.store(connections)
+            return dict(connections)
+
+    @property
+    def cache_stats(self):
+        """Dict with the number of ``hits`` and ``misses`` of the local mirror
+        of the cross-connects (see ``cache_ttl``)
+        """
+        if not self._cache:
+            return {"hits": 0, "misses": 0}
+        return {"hits": self._cache.hits, "misses": self._cache.misses}
 
     def connect(self, connection_map):
         """Receives a dict representing the desired cross-connects and
         add them to the current configuration of the device
         """
         if connection_map:
-            return self.command("oxc:swit:conn:add " + _encode(connection_map))
+            with self._write_through("add", connection_map):
+                return self.command("oxc:swit:conn:add " + _encode(connection_map))
 
     def disconnect(self, connection_map):
         """Given a dict representing the desired cross-connects,
         remove them to the current configuration of the device
         """
         if connection_map:
-            return self.command("oxc:swit:conn:sub " + _encode(connection_map))
+            with self._write_through("sub", connection_map):
+                return self.command("oxc:swit:conn:sub " + _encode(connection_map))
 
     def disconnect_all(self):
         """Remove all the active cross-connects"""
-        return self.command("oxc:swit:disc:all")
+        with self._write_through("only", {}):
+            return self.command("oxc:swit:disc:all")
+
+    @contextmanager
+    def _write_through(self, operation, connection_map):
+        """Update the local mirror (if any) when the block succeeds, or
+        invalidate it if the outcome is unknown
+        """
+        if not self._cache:
+            yield
+            return
+        with self._cache.lock:
+            try:
+                yield
+            except BaseException:
+                self._cache.invalidate()
+                raise
+            self._cache.apply(operation, connection_map)
+
+    def _write_through_future(self, operation, connection_map, future):
+        """Same as ``_write_through`` for operations in a :obj:`OxcBatch`"""
+        if not self._cache or future.cancelled():
+            return
+        if future.exception():
+            self._cache.invalidate()
+        else:
+            self._cache.apply(operation, connection_map)
+
+    def batch(self):
+        """Context manager that queues operations and send them to the device
+        in a single burst (see :obj:`OxcBatch`)
+        """
+        return OxcBatch(self)
 
     def get_power(self, port_list):
         """Get the power levels of the ports on a given list"""
+        port_list = list(port_list)
+        return self._power_result(port_list, self.read_power(port_list))
+
+    def read_power(self, port_list, out=None):
+        """Read the power levels of the ports on a given list into an array,
+        without building intermediate dicts.
 
+        ``out[i]`` receives the power level of ``port_list[i]``. If ``out`` is
+        not given, a new ``array("d")`` is allocated and returned.
+
+        Since Polatis can read just a few power levels for every message, the
+        list is split into chunks, which are pipelined in a single burst (one
+        round trip), or spread over several sessions (see ``power_sessions``).
+        A single chunk is sent as a plain query.
+        """
+        self._check_power_readings()
+        if out is None:
+            out = array("d", bytes(8 * len(port_list)))
+
+        messages = [
+            ":pmon:pow? " + _encode_list(chunk)
+            for chunk in _chunks(port_list, _MAX_POWER_READINGS)
+        ]
+        offset = 0
+        for response in self._read_chunks(messages):
+            offset = _read_power_levels(response, out, offset)
+        return out
+
+    def close(self):
+        super().close()
+        with self._power_lock:
+            executor, self._power_executor = self._power_executor, None
+            lanes, self._power_lanes = self._power_lanes, []
+        if executor:
+            executor.shutdown(wait=False)
+        for lane in lanes:
+            lane.close()
+
+    def _read_chunks(self, messages):
+        lanes = min(self._power_sessions, len(messages))
+        if lanes <= 1:
+            return _read_share(self, messages)
+
+        # Each session gets a contiguous share of the chunks, so the responses
+        # can be concatenated in order. This session reads the first share.
+        shares = list(_chunks(messages, -(-len(messages) // lanes)))
+        executor, extra = self._power_sessions_for(len(shares) - 1)
+        futures = [
+            executor.submit(_read_share, lane, share)
+            for lane, share in zip(extra, shares[1:])
+        ]
+        try:
+            first = _read_share(self, shares[0])
+        finally:
+            # Wait for all the sessions even if this one fails
+            wait(futures)
+        return chain(first, *(future.result() for future in futures))
+
+    def _power_sessions_for(self, count):
+        """Executor and extra sessions for reading power levels in parallel"""
+        with self._power_lock:
+            if self._power_executor is None:
+                self._power_executor = ThreadPoolExecutor(
+                    max_workers=self._power_sessions - 1,
+                    thread_name_prefix="oxc-power",
+                )
+            while len(self._power_lanes) < count:
+                lane = ScpiInterface(
+                    *self.address,
+                    timeout=self.timeout,
+                    logger=self._logger,
+                    transport=self.transport,
+                    observers=self._observers,
+                )
+                self._power_lanes.append(lane)
+            return self._power_executor, self._power_lanes[:count]
+
+    def _connection_result(self, connections):
+        if self._compact_results:
+            return ConnectionArray.from_mapping(connections)
+        return connections
+
+    def _power_result(self, port_list, levels):
+        if self._compact_results:
+            return PortArray.from_ports(port_list, levels)
+        return dict(zip(port_list, levels))
+
+    def _check_power_readings(self):
         pc = self.product_code
         if "I-OST" in pc:
             msg = "OXC {}:{} ({}) does not implement power readings".format(
@@ -103,20 +357,13 @@ class Oxc(ScpiInterface, OxcInterface):
             self._logger.debug(msg)
             raise NotImplementedError(msg)
 
-        port_list = list(port_list)
-        return dict(
-            # Since Polatis can ready just a few power levels for every command
-            # we need to split it into chunks
-            chain.from_iterable(
-                self._get_power(port_list[i : i + _MAX_POWER_READINGS])  # noqa
-                for i in range(0, len(port_list), _MAX_POWER_READINGS)
-            )
-        )
-
-    def _get_power(self, port_list):
-        response = self.query(":pmon:pow? " + _encode_list(port_list))
-        power_levels = [float(p) for p in response.strip("()").split(",") if p]
-        return zip(port_list, power_levels)
+    @property
+    def power_ports(self):
+        """List of ports with photodetectors (whose power level can be read)"""
+        in_ports, out_ports = self.ports
+        if self.product_code in _PROD_CODE_WITH_INPUT_PHOTODETECTORS:
+            return [*in_ports, *out_ports]
+        return out_ports
 
     @property
     def power(self):
@@ -124,12 +371,203 @@ class Oxc(ScpiInterface, OxcInterface):
 
         Returns a dict relating the port number and the power level
         """
-        in_ports, out_ports = self.ports
-        ports = out_ports
-        if self.product_code in _PROD_CODE_WITH_INPUT_PHOTODETECTORS:
-            ports = [*in_ports, *ports]
+        return self.get_power(self.power_ports)
+
+
+class OxcBatch(ScpiBatch):
+    """Queue of OXC operations to be sent to the device in a single burst
 
-        return self.get_power(ports)
+    Reconfigurations usually require several messages back to back. Inside a
+    batch they are written at once, followed by a single ``*opc?``, saving one
+    round trip per message::
+
+        with oxc.batch() as batch:
+            batch.disconnect({1: 193})
+            batch.connect({1: 194, 2: 193})
+            power = batch.get_power([193, 194])
+
+        power.result()
+        # => {193: -29.55, 194: -30.05}
+
+    All the methods return a :obj:`~concurrent.futures.Future`, resolved when
+    the batch is flushed.
+    """
+
+    def connections(self):
+        """Queue the retrieval of the active cross-connects"""
+        result = self._interface._connection_result
+        return self.query("oxc:swit:conn:stat?", lambda msg: result(_decode(msg)))
+
+    def set_connections(self, connection_map):
+        """Queue the replacement of all the cross-connects"""
+        message = "oxc:swit:conn:only " + _encode(connection_map)
+        return self._write(message, "only", connection_map)
+
+    def connect(self, connection_map):
+        """Queue the addition of the given cross-connects"""
+        if connection_map:
+            message = "oxc:swit:conn:add " + _encode(connection_map)
+            return self._write(message, "add", connection_map)
+        return _resolved(None)
+
+    def disconnect(self, connection_map):
+        """Queue the removal of the given cross-connects"""
+        if connection_map:
+            message = "oxc:swit:conn:sub " + _encode(connection_map)
+            return self._write(message, "sub", connection_map)
+        return _resolved(None)
+
+    def disconnect_all(self):
+        """Queue the removal of all the active cross-connects"""
+        return self._write("oxc:swit:disc:all", "only", {})
+
+    def _write(self, message, operation, connection_map):
+        future = self.command(message)
+        callback = self._interface._write_through_future
+        future.add_done_callback(partial(callback, operation, connection_map))
+        return future
+
+    def get_power(self, port_list):
+        """Queue the reading of the power levels of the given ports"""
+        self._interface._check_power_readings()
+        port_list = list(port_list)
+        chunks = [
+            self.query(":pmon:pow? " + _encode_list(chunk), _decode_power_levels)
+            for chunk in _chunks(port_list, _MAX_POWER_READINGS)
+        ]
+        if not chunks:
+            return _resolved({})
+
+        power = Future()
+
+        def _gather(_):
+            # Futures are resolved in order, so the last chunk is the last one
+            try:
+                levels = chain.from_iterable(chunk.result() for chunk in chunks)
+                power.set_result(self._interface._power_result(port_list, levels))
+            except BaseException as ex:
+                power.set_exception(ex)
+
+        chunks[-1].add_done_callback(_gather)
+        return power
+
+
+class _ConnectionCache(object):
+    """Local mirror of the cross-connects of a device
+
+    Arguments
+        ttl: number of seconds the mirror is considered fresh after being
+            retrieved from the device
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self._connections = None
+        self._timestamp = 0
+
+    def get(self):
+        """Copy of the mirror, or ``None`` if it is stale"""
+        with self.lock:
+            if self._connections is None or monotonic() - self._timestamp > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(self._connections)
+
+    def store(self, connections):
+        with self.lock:
+            self._connections = dict(connections)
+            self._timestamp = monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self._connections = None
+
+    def apply(self, operation, connection_map):
+        """Reproduce in the mirror the effect of a successful operation
+        (``add``, ``sub`` or ``only``) on the device
+        """
+        with self.lock:
+            if self._connections is None:
+                return
+            pairs = _sort_pairs(connection_map).items()
+            if operation == "only":
+                self._connections = dict(pairs)
+            elif operation == "sub":
+                for port_in, port_out in pairs:
+                    if self._connections.get(port_in) == port_out:
+                        del self._connections[port_in]
+            else:
+                # Ports can be part of just a single cross-connect
+                outputs = {port_out: port_in for port_in, port_out in pairs}
+                self._connections = {
+                    port_in: port_out
+                    for port_in, port_out in self._connections.items()
+                    if port_out not in outputs
+                }
+                self._connections.update(pairs)
+
+
+def _chunks(sequence, size):
+    """Split a sequence in chunks with a maximum size"""
+    return (sequence[i : i + size] for i in range(0, len(sequence), size))  # noqa
+
+
+def _read_share(session, messages):
+    """Responses to the queries, pipelined in a burst only if there are
+    several (a single one is sent as a plain query)
+    """
+    if len(messages) == 1:
+        return [session.query(messages[0])]
+    return session.burst(messages, len(messages)) if messages else []
+
+
+def _resolved(value):
+    """Future already resolved with the given value"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _parse_number_of_ports(product_code):
+    """Extract the tuple (number of inputs, number of outputs) from the
+    product code, or ``None`` if it does not follow the Polatis convention
+    """
+    match = PORT_NUMBER_REGEX.findall(product_code)
+    if not match:
+        return None
+    return (int(match[0][0]), int(match[0][1]))
+
+
+def _ports(number_of_ports):
+    """Tuple (list of "input" ports, list of "output" ports)"""
+    num = number_of_ports
+    return (list(range(1, num[0] + 1)), list(range(num[0] + 1, sum(num) + 1)))
+
+
+def _decode_network_config(message):
+    """Transform the response of ``:syst:comm:netw:addr?`` into a dict"""
+    pairs = (pair.split("=") for pair in message.split())
+    return {key.strip(" \t"): value.strip('" \t') for key, value in pairs}
+
+
+def _decode_power_levels(message):
+    """Transform the response of ``:pmon:pow?`` into a list of floats"""
+    return [float(p) for p in message.strip("()").split(",") if p]
+
+
+def _read_power_levels(message, out, offset=0):
+    """Parse the response of ``:pmon:pow?`` straight into ``out``, starting
+    at the given offset. Returns the offset after the last level written.
+    """
+    for level in message.strip("()").split(","):
+        if level:
+            out[offset] = float(level)
+            offset += 1
+    return offset
 
 
 def _encode(connection_map):
@@ -139,12 +577,14 @@ def _encode(connection_map):
         (@i1,i2,i3,...,iN),(@o1,o2,o3,...,oN)
 
     Where ``iX`` corresponds to the input port number X, and ``oX`` corresponds
-    to the output port number X.
+    to the output port number X. Runs of consecutive ports are compressed
+    as ranges (see :func:`_encode_list`).
     """
     connection_map = _sort_pairs(connection_map)
-    in_ports = map(str, connection_map.keys())
-    out_ports = map(str, connection_map.values())
-    return "(@{}),(@{})".format(",".join(in_ports), ",".join(out_ports))
+    return "(@{}),(@{})".format(
+        _encode_channels(connection_map.keys()),
+        _encode_channels(connection_map.values()),
+    )
 
 
 def _decode(message):
@@ -154,13 +594,10 @@ def _decode(message):
         (@i1,i2,i3,...,iN),(@o1,o2,o3,...,oN)
 
     Where ``iX`` corresponds to the input port number X, and ``oX`` corresponds
-    to the output port number X.
+    to the output port number X. Ranges (``iX:iY``) are expanded.
     """
-    in_ports, out_ports = [
-        [int(port.strip(" \t")) for port in part.strip("(@)").split(",") if port]
-        for part in message.split("),(")
-    ]
-    return dict(zip(in_ports, out_ports))
+    in_ports, _, out_ports = message.partition("),(")
+    return dict(zip(_decode_channels(in_ports), _decode_channels(out_ports)))
 
 
 def _encode_list(port_list):
@@ -168,10 +605,52 @@ def _encode_list(port_list):
 
         (@p1,p2,p3,...,pN)
 
-    Where ``pX`` corresponds to the port number X.
+    Where ``pX`` corresponds to the port number X. Runs of consecutive
+    ascending ports are compressed as ranges, e.g. ``(@1:48,50)``.
+    """
+    return "(@{})".format(_encode_channels(port_list))
+
+
+def _encode_channels(ports):
+    """Comma separated list of ports, with runs of consecutive ports written
+    as ``first:last``
+    """
+    items = []
+    first = last = None
+    for port in ports:
+        port = int(port)
+        if last is not None and port == last + 1:
+            last = port
+            continue
+        if first is not None:
+            items.append(_encode_range(first, last))
+        first = last = port
+    if first is not None:
+        items.append(_encode_range(first, last))
+    return ",".join(items)
+
+
+def _encode_range(first, last):
+    if first == last:
+        return str(first)
+    if last == first + 1:
+        # As short as the range, but simpler
+        return "{},{}".format(first, last)
+    return "{}:{}".format(first, last)
+
+
+def _decode_channels(message):
+    """Iterate over the ports in a SCPI channel list (e.g. ``(@1,2,5:7)``),
+    expanding the ranges
     """
-    ports = map(str, port_list)
-    return "(@{})".format(",".join(ports))
+    for item in message.strip(" \t(@)").split(","):
+        first, colon, last = item.partition(":")
+        if colon:
+            first, last = int(first), int(last)
+            step = 1 if last >= first else -1
+            yield from range(first, last + step, step)
+        elif first.strip(" \t"):
+            yield int(first)
 
 
 def _sort_pairs(connection_map):
@@ -179,5 +658,10 @@ def _sort_pairs(connection_map):
     order.
     IN_PORT should always be < than OUT_PORT.
     """
-    connections = ((int(k), int(v)) for k, v in (connection_map or {}).items())
-    return dict([sorted(pair) for pair in connections])
+    pairs = {}
+    for port_in, port_out in (connection_map or {}).items():
+        port_in, port_out = int(port_in), int(port_out)
+        if port_in > port_out:
+            port_in, port_out = port_out, port_in
+        pairs[port_in] = port_out
+    return pairs
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Asynchronous (asyncio based) API for Polatis Optical Cross-Connectors.
+
+The objects in this module mirror :obj:`~devicecontrol.polatis.Oxc`, but all
+the methods that communicate with the device are coroutines, and all the
+properties that communicate with the device return awaitables::
+
+    async with AsyncOxc("192.168.0.3") as oxc:
+        await oxc.connect({1: 193})
+        await oxc.connections
+        # => {1: 193}
+        await oxc.get_power([193])
+        # => {193: -29.55}
+"""
+from . import (
+    _MAX_POWER_READINGS,
+    _PROD_CODE_WITH_INPUT_PHOTODETECTORS,
+    _decode,
+    _decode_network_config,
+    _decode_power_levels,
+    _encode,
+    _encode_list,
+    _parse_number_of_ports,
+    _ports,
+)
+from .scpi import AsyncScpiInterface
+
+
+class AsyncOxc(AsyncScpiInterface):
+    """Interacts with a Polatis Optical Cross Connector using SCPI over
+    asyncio streams
+    """
+
+    @property
+    async def product_code(self):
+        if not hasattr(self, "_product_code"):
+            self._product_code = (await self.idn)[1]
+        return self._product_code
+
+    @property
+    async def number_of_ports(self):
+        """Awaitable tuple with the number of inputs and output ports
+        respectively"""
+        number_of_ports = _parse_number_of_ports(await self.product_code)
+        if not number_of_ports:
+            msg = "Device {}:{} {} does not seem to be a Polatis OXC".format(
+                *self.address, await self.idn
+            )
+            self._logger.debug(msg)
+            raise SystemError(msg)
+        return number_of_ports
+
+    @property
+    async def ports(self):
+        """Awaitable tuple (list of "input" ports, list of "output" ports)"""
+        return _ports(await self.number_of_ports)
+
+    @property
+    async def network_config(self):
+        """Retrieve a dict with the device network configuration"""
+        return _decode_network_config(await self.query(":syst:comm:netw:addr?"))
+
+    @property
+    async def connections(self):
+        """Retrieve a dict representing all the active cross-connects"""
+        return _decode(await self.query("oxc:swit:conn:stat?"))
+
+    async def set_connections(self, connection_map):
+        """Replace all the previous cross-connects with a new configuration
+
+        Equivalent to ``disconnect_all`` + ``connect``
+        (properties cannot be assigned asynchronously, so this coroutine
+        replaces the ``connections`` setter of the synchronous API)
+        """
+        return await self.command("oxc:swit:conn:only " + _encode(connection_map))
+
+    async def connect(self, connection_map):
+        """Receives a dict representing the desired cross-connects and
+        add them to the current configuration of the device
+        """
+        if connection_map:
+            return await self.command("oxc:swit:conn:add " + _encode(connection_map))
+
+    async def disconnect(self, connection_map):
+        """Given a dict representing the desired cross-connects,
+        remove them to the current configuration of the device
+        """
+        if connection_map:
+            return await self.command("oxc:swit:conn:sub " + _encode(connection_map))
+
+    async def disconnect_all(self):
+        """Remove all the active cross-connects"""
+        return await self.command("oxc:swit:disc:all")
+
+    async def get_power(self, port_list):
+        """Get the power levels of the ports on a given list"""
+
+        pc = await self.product_code
+        if "I-OST" in pc:
+            msg = "OXC {}:{} ({}) does not implement power readings".format(
+                *self.address, pc
+            )
+            self._logger.debug(msg)
+            raise NotImplementedError(msg)
+
+        port_list = list(port_list)
+        power = {}
+        # Since Polatis can ready just a few power levels for every command
+        # we need to split it into chunks
+        for i in range(0, len(port_list), _MAX_POWER_READINGS):
+            chunk = port_list[i : i + _MAX_POWER_READINGS]  # noqa
+            response = await self.query(":pmon:pow? " + _encode_list(chunk))
+            power.update(zip(chunk, _decode_power_levels(response)))
+        return power
+
+    @property
+    async def power(self):
+        """Get all power levels available.
+
+        Returns a dict relating the port number and the power level
+        """
+        in_ports, out_ports = await self.ports
+        ports = out_ports
+        if await self.product_code in _PROD_CODE_WITH_INPUT_PHOTODETECTORS:
+            ports = [*in_ports, *ports]
+
+        return await self.get_power(ports)
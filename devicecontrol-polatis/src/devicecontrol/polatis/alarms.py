@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Power threshold alarms.
+
+:obj:`PowerAlarms` reads the power levels of the watched ports at a fixed
+rate and reports only the transitions (alarm raised/cleared) as
+:obj:`AlarmEvent`, delivered to callbacks and/or a queue::
+
+    events = queue.Queue()
+    alarms = PowerAlarms(oxc, interval=0.5, queue=events)
+    alarms.add(range(193, 385), low=-25, hysteresis=1)
+    with alarms:
+        event = events.get()
+        # => AlarmEvent(port=200, kind='low', raised=True, level=-31.2, ...)
+
+The thresholds, the current state and the last readings are kept in arrays
+aligned with the list of watched ports, so each sweep is a single pass over
+flat arrays, without building or diffing dicts.
+"""
+import logging
+import math
+import threading
+from array import array
+from collections import namedtuple
+from time import time
+
+from .monitor import _read_power, _run_periodically
+
+AlarmEvent = namedtuple("AlarmEvent", "port kind raised level threshold timestamp")
+AlarmEvent.__doc__ = """Transition of a power alarm: ``kind`` is ``"low"`` or
+``"high"``, ``raised`` is ``True`` when the alarm starts and ``False`` when it
+clears, ``level`` is the power level (dBm) that caused the transition and
+``threshold`` the limit crossed
+"""
+
+NORMAL, LOW, HIGH = 0, -1, 1
+_KINDS = {LOW: "low", HIGH: "high"}
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PowerAlarms(object):
+    """Watch the power levels of some ports against thresholds
+
+    Arguments
+        oxc: device used for reading the power levels, with ``read_power``
+            when implemented (like :obj:`~devicecontrol.polatis.Oxc`), or
+            with ``get_power`` otherwise (e.g. :obj:`~.slicing.VirtualOxc`)
+        interval: number of seconds between sweeps
+        callbacks: list of callables receiving each :obj:`AlarmEvent`
+        queue: (Optional) object with a ``put`` method (e.g.
+            :obj:`queue.Queue`) receiving each :obj:`AlarmEvent`
+
+    An alarm is raised when the level goes below ``low`` (or above ``high``)
+    and cleared only when it comes back beyond the threshold by more than
+    ``hysteresis`` dB, so levels oscillating around the threshold do not
+    produce a flood of events.
+    """
+
+    INTERVAL = 1
+    HYSTERESIS = 0.5  # dB
+
+    def __init__(self, oxc, interval=INTERVAL, callbacks=(), queue=None, logger=None):
+        self.oxc = oxc
+        self.interval = interval
+        self.callbacks = list(callbacks)
+        self.queue = queue
+        self.ports = []
+        self._index = {}  # port => position in the arrays
+        self._low = array("d")
+        self._high = array("d")
+        self._hysteresis = array("d")
+        self._state = array("b")
+        self._levels = array("d")
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._logger = logger or LOGGER
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def add(self, ports, low=None, high=None, hysteresis=HYSTERESIS):
+        """Watch the given ports (single port, list or range), replacing
+        their previous thresholds (``None`` disables a limit)
+        """
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        with self._lock:
+            for port in _port_list(ports):
+                i = self._index.get(port)
+                if i is None:
+                    self._index[port] = i = len(self.ports)
+                    self.ports.append(port)
+                    self._low.append(low)
+                    self._high.append(high)
+                    self._hysteresis.append(hysteresis)
+                    self._state.append(NORMAL)
+                    self._levels.append(math.nan)
+                else:
+                    self._low[i], self._high[i] = low, high
+                    self._hysteresis[i] = hysteresis
+
+    def remove(self, ports):
+        """Stop watching the given ports (single port, list or range)"""
+        removed = set(_port_list(ports))
+        with self._lock:
+            keep = [i for i, port in enumerate(self.ports) if port not in removed]
+            self.ports = [self.ports[i] for i in keep]
+            self._index = {port: i for i, port in enumerate(self.ports)}
+            for name in ("_low", "_high", "_hysteresis", "_state", "_levels"):
+                values = getattr(self, name)
+                setattr(self, name, array(values.typecode, (values[i] for i in keep)))
+
+    def active(self):
+        """Dict relating the ports currently in alarm to the kind of alarm"""
+        with self._lock:
+            return {
+                port: _KINDS[state]
+                for port, state in zip(self.ports, self._state)
+                if state
+            }
+
+    def check(self):
+        """Sweep the power levels right away, returning the list of events"""
+        with self._lock:
+            if not self.ports:
+                return []
+            _read_power(self.oxc, self.ports, self._levels)
+            events = self._evaluate(self._levels, time())
+        self._dispatch(events)
+        return events
+
+    def evaluate(self, levels, timestamp=None):
+        """Evaluate power levels obtained elsewhere (``levels[i]`` is the level
+        of ``ports[i]``), dispatching and returning the list of events
+        """
+        with self._lock:
+            events = self._evaluate(levels, time() if timestamp is None else timestamp)
+        self._dispatch(events)
+        return events
+
+    def start(self):
+        """Start sweeping in a background thread"""
+        if not self._thread:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _evaluate(self, levels, timestamp):
+        low, high, hysteresis, state = (
+            self._low,
+            self._high,
+            self._hysteresis,
+            self._state,
+        )
+        events = []
+        for i, level in enumerate(levels):
+            current = state[i]
+            # Most of the ports are in a steady state: a single chained comparison
+            if current == NORMAL:
+                if low[i] <= level <= high[i] or level != level:  # nan
+                    continue
+                new = LOW if level < low[i] else HIGH
+            elif current == LOW:
+                if level <= low[i] + hysteresis[i] or level != level:
+                    continue
+                new = HIGH if level > high[i] else NORMAL
+            else:
+                if level >= high[i] - hysteresis[i] or level != level:
+                    continue
+                new = LOW if level < low[i] else NORMAL
+
+            state[i] = new
+            port = self.ports[i]
+            if current != NORMAL:
+                limit = low[i] if current == LOW else high[i]
+                events.append(
+                    AlarmEvent(port, _KINDS[current], False, level, limit, timestamp)
+                )
+            if new != NORMAL:
+                limit = low[i] if new == LOW else high[i]
+                events.append(
+                    AlarmEvent(port, _KINDS[new], True, level, limit, timestamp)
+                )
+        return events
+
+    def _dispatch(self, events):
+        for event in events:
+            if self.queue is not None:
+                self.queue.put(event)
+            for callback in self.callbacks:
+                try:
+                    callback(event)
+                except Exception:
+                    self._logger.exception("Error in alarm callback %r", callback)
+
+    def _run(self):
+        _run_periodically(self.check, self.interval, self._stop, self._logger)
+
+
+def _port_list(ports):
+    if isinstance(ports, int):
+        return [ports]
+    return [int(port) for port in ports]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Concurrent operations over many OXCs.
+
+:obj:`OxcFleet` fans the same operation out to a group of devices
+(:obj:`~devicecontrol.polatis.Oxc`, :obj:`~.slicing.VirtualOxc` or anything
+implementing :obj:`~.interface.OxcInterface`) using a bounded pool of
+threads, so a snapshot of the whole fleet takes about as long as the slowest
+device::
+
+    fleet = OxcFleet({"lab-1": Oxc(IP_ADDR_1), "lab-2": Oxc(IP_ADDR_2)},
+                     deadline=10)
+    snapshot = fleet.connections()
+    snapshot.results
+    # => {"lab-1": {1: 193}, "lab-2": {}}
+    snapshot.errors
+    # => {}
+    snapshot.timeouts
+    # => []
+
+Failures are reported per device, they never interrupt the operation in the
+remaining devices.
+"""
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import monotonic
+
+FleetResult = namedtuple("FleetResult", "results errors timeouts elapsed")
+FleetResult.__doc__ = """Outcome of an operation executed by :obj:`OxcFleet`:
+dict relating the name of each device to its result (``results``) or to the
+exception raised (``errors``), list with the names of the devices that did
+not finish before the deadline (``timeouts``) and the number of seconds the
+whole operation took (``elapsed``)
+"""
+
+
+class OxcFleet(object):
+    """Group of OXCs operated concurrently
+
+    Arguments
+        devices: dict relating names and devices, or list of devices (named
+            ``host:port``, or ``str(device)`` if they have no address)
+        max_workers: maximum number of devices operated at the same time
+        deadline: maximum number of seconds each device is given to complete
+            an operation (counted from the moment the device is picked by a
+            worker). ``None`` waits indefinitely.
+
+    When a device misses the deadline its result is discarded, and the
+    request in progress is interrupted with ``abort`` (see
+    :obj:`~devicecontrol.polatis.scpi.ScpiInterface.abort`), which releases
+    the worker right away. The session of the device is then closed, to be
+    re-established by the next operation (other threads using the same
+    device at that moment may get :obj:`~.scpi.ScpiDisconnected`).
+    Devices without ``abort`` (e.g. :obj:`~.slicing.VirtualOxc`) keep their
+    worker busy until they finish, as Python threads cannot be interrupted.
+    """
+
+    MAX_WORKERS = 16
+
+    def __init__(self, devices, max_workers=MAX_WORKERS, deadline=None):
+        if not hasattr(devices, "items"):
+            devices = {_name(device): device for device in devices}
+        self.devices = dict(devices)
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="oxc-fleet"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return len(self.devices)
+
+    def close(self):
+        """Release the worker threads (the devices are not closed)"""
+        self._executor.shutdown(wait=False)
+
+    def run(self, operation, names=None):
+        """Call ``operation(device)`` for each device concurrently.
+
+        ``names`` restricts the operation to some of the devices.
+        Returns a :obj:`FleetResult`.
+        """
+        names = list(self.devices if names is None else names)
+        self._check(names)
+        return self._run(
+            {name: partial(operation, self.devices[name]) for name in names}
+        )
+
+    def idn(self):
+        """Identification of all the devices"""
+        return self.run(lambda oxc: oxc.idn)
+
+    def connections(self):
+        """Active cross-connects of all the devices"""
+        return self.run(lambda oxc: oxc.connections)
+
+    def power(self):
+        """All the power levels available in all the devices"""
+        return self.run(lambda oxc: oxc.power)
+
+    def connect(self, connection_maps):
+        """Add cross-connects to several devices
+
+        Arguments
+            connection_maps: dict relating the name of each device to the
+                cross-connects to be added
+        """
+        return self._apply("connect", connection_maps)
+
+    def disconnect(self, connection_maps):
+        """Remove cross-connects from several devices
+
+        Arguments
+            connection_maps: dict relating the name of each device to the
+                cross-connects to be removed
+        """
+        return self._apply("disconnect", connection_maps)
+
+    def _apply(self, method, connection_maps):
+        self._check(connection_maps)
+        return self._run(
+            {
+                name: partial(getattr(self.devices[name], method), connection_map)
+                for name, connection_map in connection_maps.items()
+            }
+        )
+
+    def _check(self, names):
+        unknown = [str(name) for name in names if name not in self.devices]
+        if unknown:
+            raise KeyError("Unknown devices: {}".format(", ".join(unknown)))
+
+    def _run(self, calls):
+        return _Execution(self._executor, self.deadline, calls, self.devices).collect()
+
+
+class _Execution(object):
+    """Single fan-out of an operation, tracking when each device starts and
+    finishes for enforcing the deadline
+    """
+
+    def __init__(self, executor, deadline, calls, devices):
+        self.deadline = deadline
+        self.devices = devices
+        self.start = monotonic()
+        self.started = {}  # name => monotonic time
+        self.finished = set()  # Calls that returned (maybe not delivered yet)
+        self.aborted = set()
+        self.condition = threading.Condition()
+        self.futures = {
+            name: executor.submit(self._call, name, call)
+            for name, call in calls.items()
+        }
+        for future in self.futures.values():
+            future.add_done_callback(self._notify)
+
+    def _call(self, name, call):
+        with self.condition:
+            self.started[name] = monotonic()
+            self.condition.notify_all()
+        try:
+            return call()
+        finally:
+            with self.condition:
+                self.finished.add(name)
+                if name in self.aborted:
+                    # The interrupted session is unusable, it is
+                    # re-established by the next operation
+                    self.devices[name].close()
+
+    def _notify(self, _):
+        with self.condition:
+            self.condition.notify_all()
+
+    def collect(self):
+        results, errors, timeouts = {}, {}, []
+        pending = dict(self.futures)
+        with self.condition:
+            while pending:
+                now = monotonic()
+                for name, future in list(pending.items()):
+                    if future.done():
+                        del pending[name]
+                        if future.exception() is None:
+                            results[name] = future.result()
+                        else:
+                            errors[name] = future.exception()
+                    elif self._expired(name, now):
+                        del pending[name]
+                        self._abort(name)
+                        timeouts.append(name)
+                if pending:
+                    self.condition.wait(self._next_expiry(pending, now))
+
+        return FleetResult(results, errors, timeouts, monotonic() - self.start)
+
+    def _abort(self, name):
+        """Give up on a device that missed the deadline (called holding the
+        condition, so the call cannot finish meanwhile)
+        """
+        abort = getattr(self.devices[name], "abort", None)
+        if abort is not None and name not in self.finished:
+            # A finished call left the session idle, it must not be broken
+            self.aborted.add(name)
+            abort()
+
+    def _expired(self, name, now):
+        started = self.started.get(name)
+        return (
+            self.deadline is not None
+            and started is not None
+            and now - started >= self.deadline
+        )
+
+    def _next_expiry(self, pending, now):
+        """Seconds until the next deadline (``None`` if nothing can expire)"""
+        if self.deadline is None:
+            return None
+        expiries = [self.started[n] for n in pending if n in self.started]
+        if not expiries:
+            return None
+        return max(0, min(expiries) + self.deadline - now)
+
+
+def _name(device):
+    address = getattr(device, "address", None)
+    if address:
+        return "{}:{}".format(*address)
+    return str(device)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Aggregators for the events reported to the observers of
+:obj:`~.scpi.ScpiInterface` (see :obj:`~.scpi.ScpiEvent`).
+"""
+import math
+import threading
+from collections import Counter
+
+
+class LatencyHistogram(object):
+    """In-memory latency histogram per device and per verb
+
+    It can be attached to any :obj:`~.scpi.ScpiInterface` as an observer::
+
+        histogram = LatencyHistogram()
+        oxc = Oxc(IP_ADDR, PORT, observers=[histogram])
+        oxc.connections
+        histogram.summary()
+        # => {(('192.168.0.3', 5025), 'oxc:swit:conn:stat?'):
+        #        {'count': 1, 'p50': 0.012, 'p95': 0.012, 'p99': 0.012, ...}}
+
+    Latencies are counted in logarithmic buckets, so the memory used does not
+    depend on the number of samples, and the percentiles have a relative error
+    bounded by ``resolution``.
+
+    Arguments
+        resolution: relative width of each bucket
+    """
+
+    RESOLUTION = 0.05
+    MIN_LATENCY = 1e-5  # seconds, lower bound of the first bucket
+
+    def __init__(self, resolution=RESOLUTION):
+        self._log_base = math.log1p(resolution)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        bucket = self._bucket(event.elapsed)
+        key = (tuple(event.address), event.verb)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.add(bucket, event)
+
+    def percentile(self, address, verb, percent):
+        """Latency (seconds) below which the given percentage of the messages
+        (with the given verb, sent to the given device) was answered
+        """
+        with self._lock:
+            series = self._series.get((tuple(address), verb))
+            if series is None:
+                return None
+            return self._latency(series.percentile(percent))
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Dict relating ``(address, verb)`` to the statistics of the messages:
+        ``count``, percentiles (``p50``, ``p95``, ``p99``), ``mean`` latency,
+        bytes ``sent``/``received``, ``retries`` and ``outcomes`` (counter)
+        """
+        with self._lock:
+            return {
+                key: dict(
+                    {
+                        "p{}".format(p): self._latency(series.percentile(p))
+                        for p in percentiles
+                    },
+                    count=series.count,
+                    mean=series.total / series.count,
+                    sent=series.sent,
+                    received=series.received,
+                    retries=series.retries,
+                    outcomes=dict(series.outcomes),
+                )
+                for key, series in self._series.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def _bucket(self, elapsed):
+        if elapsed <= self.MIN_LATENCY:
+            return 0
+        return int(math.log(elapsed / self.MIN_LATENCY) / self._log_base)
+
+    def _latency(self, bucket):
+        # Geometric mean of the bucket boundaries
+        return self.MIN_LATENCY * math.exp((bucket + 0.5) * self._log_base)
+
+
+class _Series(object):
+    """Statistics of the messages with the same verb sent to the same device"""
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.sent = 0
+        self.received = 0
+        self.retries = 0
+        self.outcomes = Counter()
+
+    def add(self, bucket, event):
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += event.elapsed
+        self.sent += event.sent
+        self.received += event.received
+        self.retries += event.retries
+        self.outcomes[event.outcome] += 1
+
+    def percentile(self, percent):
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for bucket in sorted(self.buckets):
+            cumulative += self.buckets[bucket]
+            if cumulative >= rank:
+                return bucket
+        return bucket
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cache of static device metadata (identification, product code and number
+of ports), shared by all the :obj:`~devicecontrol.polatis.Oxc` objects
+pointing to the same address (through :obj:`METADATA_CACHE` unless another
+cache is given) and, optionally, persisted in a JSON file so freshly started
+processes don't need to query the devices::
+
+    cache = MetadataCache("~/.cache/polatis.json", ttl=24 * 3600)
+    oxc = Oxc(IP_ADDR, metadata_cache=cache)
+    oxc.number_of_ports  # `*idn?` is sent only if the entry is missing/stale
+    # => (192, 192)
+"""
+import json
+import logging
+import os
+import threading
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MetadataCache(object):
+    """Metadata of devices keyed by address ``(host, port)``
+
+    Arguments
+        path: (Optional) JSON file where the entries are persisted. It is
+            read on first use and rewritten when an entry changes.
+        ttl: number of seconds an entry is valid after being stored
+    """
+
+    TTL = 24 * 3600
+
+    def __init__(self, path=None, ttl=TTL, logger=None):
+        self.path = path and os.path.expanduser(path)
+        self.ttl = ttl
+        self._entries = None  # Loaded on demand
+        self._lock = threading.Lock()
+        self._logger = logger or LOGGER
+
+    def get(self, address):
+        """Dict with the metadata of the device, or ``None`` if the entry is
+        missing or stale
+        """
+        with self._lock:
+            entry = self._load().get(_key(address))
+            if entry is None or time() - entry["timestamp"] > self.ttl:
+                return None
+            return dict(entry["metadata"])
+
+    def store(self, address, metadata):
+        """Replace the metadata of the device"""
+        with self._lock:
+            entries = self._load()
+            entries[_key(address)] = {"timestamp": time(), "metadata": metadata}
+            self._save(entries)
+
+    def invalidate(self, address=None):
+        """Remove the entry of a device (or all the entries)"""
+        with self._lock:
+            entries = self._load()
+            if address is None:
+                entries.clear()
+            else:
+                entries.pop(_key(address), None)
+            self._save(entries)
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path) as fp:
+                        self._entries = json.load(fp)
+                except (OSError, ValueError):
+                    self._logger.warning(
+                        "Ignoring invalid metadata cache %s", self.path, exc_info=True
+                    )
+        return self._entries
+
+    def _save(self, entries):
+        if not self.path:
+            return
+        # Write a temporary file and rename, so readers never see half a file
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            with open(tmp, "w") as fp:
+                json.dump(entries, fp, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            self._logger.warning(
+                "Could not save metadata cache %s", self.path, exc_info=True
+            )
+
+
+def _key(address):
+    return "{}:{}".format(*address)
+
+
+METADATA_CACHE = MetadataCache()
+"""Cache shared by all the :obj:`~devicecontrol.polatis.Oxc` of the process
+(in memory only)"""
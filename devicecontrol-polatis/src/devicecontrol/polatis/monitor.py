@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Continuous monitoring of power levels.
+
+:obj:`PowerMonitor` samples a set of ports at a fixed rate and keeps the
+history in a preallocated ring buffer of single precision floats, so the
+memory used is bounded and no dict is built for each sample::
+
+    with PowerMonitor(oxc, ports=range(193, 385), interval=0.5) as monitor:
+        for timestamp, levels in monitor.samples():
+            ...  # levels[i] is the power level of monitor.ports[i]
+
+        monitor.latest()
+        # => {193: -29.55, 194: -30.05, ...}
+        monitor.window(20).min
+        # => {193: -31.2, 194: -30.1, ...}
+        monitor.changed(3.0, samples=20)
+        # => [194]
+"""
+import asyncio
+import logging
+import math
+import threading
+from array import array
+from collections import namedtuple
+from time import monotonic, time
+
+WindowStats = namedtuple("WindowStats", "mean min max")
+WindowStats.__doc__ = """Statistics of the power levels in a window of samples:
+dicts relating each port to the ``mean``, ``min`` and ``max`` levels
+"""
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PowerMonitor(object):
+    """Sample the power levels of a set of ports at a fixed rate
+
+    Arguments
+        oxc: device used for reading the power levels. When it implements
+            ``read_power`` (like :obj:`~devicecontrol.polatis.Oxc`), the
+            levels are read straight into the ring buffer, otherwise
+            ``get_power`` is used.
+        ports: list of ports being monitored
+        interval: number of seconds between samples
+        history: maximum number of samples kept
+
+    The history is stored in an ``array("f")`` with ``history`` rows of
+    ``len(ports)`` levels each. Levels not sampled yet are ``nan``.
+    """
+
+    INTERVAL = 1
+    HISTORY = 600
+
+    def __init__(self, oxc, ports, interval=INTERVAL, history=HISTORY, logger=None):
+        self.oxc = oxc
+        self.ports = list(ports)
+        self.interval = interval
+        self.history = history
+        width = len(self.ports)
+        self._levels = array("f", [math.nan]) * (width * history)
+        self._timestamps = array("d", [math.nan]) * history
+        self._view = memoryview(self._levels)
+        self._count = 0  # Total number of samples taken
+        self._writing = 0  # 1 while the oldest row is being overwritten
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+        self._logger = logger or LOGGER
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def __len__(self):
+        """Number of samples available"""
+        return min(self._count, self.history)
+
+    @property
+    def count(self):
+        """Total number of samples taken since the monitor was created"""
+        return self._count
+
+    def sample(self):
+        """Take a sample right away, storing it in the ring buffer"""
+        width = len(self.ports)
+        with self._condition:
+            row = self._count % self.history
+            # Hide the row from the readers while it is overwritten
+            self._writing = int(self._count >= self.history)
+        start = row * width
+        levels = self._view[start : start + width]  # noqa
+        try:
+            _read_power(self.oxc, self.ports, levels)
+        except BaseException:
+            levels[:] = array("f", [math.nan]) * width
+            raise
+        finally:
+            with self._condition:
+                self._writing = 0
+                self._timestamps[row] = time()
+                self._count += 1
+                self._condition.notify_all()
+
+    def start(self):
+        """Start sampling in a background thread"""
+        if not self._thread:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling (the history is kept)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        with self._condition:
+            self._condition.notify_all()
+
+    def samples(self, timeout=None):
+        """Generator of ``(timestamp, levels)`` for every new sample, where
+        ``levels`` is a read-only view of the ring buffer row (valid until the
+        row is overwritten, ``history`` samples later).
+
+        Samples overwritten before being consumed are skipped. The generator
+        finishes when the monitor is stopped or no sample arrives in
+        ``timeout`` seconds.
+        """
+        return self._samples(timeout, threading.Event())
+
+    def _samples(self, timeout, closed):
+        """Generator of :obj:`samples`, finishing also when the ``closed``
+        event is set (the waiting readers must be notified)
+        """
+        seen = self._count
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(
+                    lambda: self._count > seen
+                    or self._stop.is_set()
+                    or closed.is_set(),
+                    timeout,
+                ):
+                    return
+                if closed.is_set():
+                    return
+                if self._count <= seen:
+                    return
+                seen = max(seen, self._count - self.history + self._writing)
+                index = seen
+            seen += 1
+            yield self._row(index)
+
+    def __aiter__(self):
+        return self._async_samples()
+
+    async def _async_samples(self):
+        loop = asyncio.get_running_loop()
+        closed = threading.Event()
+        samples = self._samples(None, closed)
+        sentinel = object()
+        try:
+            while True:
+                sample = await loop.run_in_executor(None, next, samples, sentinel)
+                if sample is sentinel:
+                    return
+                yield sample
+        finally:
+            # Closed or cancelled: release the executor thread waiting for the
+            # next sample
+            closed.set()
+            with self._condition:
+                self._condition.notify_all()
+
+    def latest(self):
+        """Dict relating each port to its last power level sampled"""
+        with self._condition:
+            if not self._count:
+                return {}
+            _, levels = self._row(self._count - 1)
+            return dict(zip(self.ports, levels))
+
+    def window(self, samples=None):
+        """Compute :obj:`WindowStats` for the last ``samples`` samples
+        (all the history by default)
+        """
+        width = len(self.ports)
+        with self._condition:
+            rows = self._last_rows(samples)
+            if not rows:
+                nan = dict.fromkeys(self.ports, math.nan)
+                return WindowStats(nan, dict(nan), dict(nan))
+            total = array("d", bytes(8 * width))
+            low = array("f", [math.inf]) * width
+            high = array("f", [-math.inf]) * width
+            for row in rows:
+                start = row * width
+                for i, level in enumerate(self._view[start : start + width]):  # noqa
+                    total[i] += level
+                    if level < low[i]:
+                        low[i] = level
+                    if level > high[i]:
+                        high[i] = level
+
+        count = len(rows)
+        return WindowStats(
+            {port: total[i] / count for i, port in enumerate(self.ports)},
+            dict(zip(self.ports, low)),
+            dict(zip(self.ports, high)),
+        )
+
+    def changed(self, threshold, samples=None):
+        """List of ports whose power level varied more than ``threshold`` dB
+        in the last ``samples`` samples (all the history by default)
+        """
+        stats = self.window(samples)
+        return [p for p in self.ports if stats.max[p] - stats.min[p] > threshold]
+
+    def _row(self, index):
+        row = index % self.history
+        width = len(self.ports)
+        start = row * width
+        return self._timestamps[row], self._view[start : start + width].toreadonly()
+
+    def _last_rows(self, samples):
+        available = min(self._count, self.history - self._writing)
+        samples = available if samples is None else min(samples, available)
+        return [i % self.history for i in range(self._count - samples, self._count)]
+
+    def _run(self):
+        _run_periodically(self.sample, self.interval, self._stop, self._logger)
+
+
+def _read_power(oxc, ports, levels):
+    """Read the power levels of the ports into ``levels`` (``nan`` for the
+    missing ones), with ``read_power`` if the device implements it, or with
+    ``get_power`` otherwise (e.g. :obj:`~.slicing.VirtualOxc`)
+    """
+    read_power = getattr(oxc, "read_power", None)
+    if read_power:
+        read_power(ports, levels)
+        return
+    power = oxc.get_power(ports)
+    for i, port in enumerate(ports):
+        levels[i] = power.get(port, math.nan)
+
+
+def _run_periodically(action, interval, stop, logger):
+    """Call ``action`` at a fixed rate until the ``stop`` event is set"""
+    deadline = monotonic()
+    while not stop.is_set():
+        try:
+            action()
+        except Exception:
+            logger.exception("Error in periodic %s", action.__name__)
+        # Fixed rate: skip the runs that are already late
+        deadline += interval
+        now = monotonic()
+        if deadline < now:
+            deadline += math.ceil((now - deadline) / interval) * interval
+        stop.wait(deadline - now)
@@ -1,15 +1,19 @@
-from click import command, option
+from click import BadParameter, Path, command, option
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import subprocess
+import threading
 from tornado.escape import json_decode
 import tornado.ioloop
 import tornado.web
 
-from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.pool import SESSION_POOL
+from devicecontrol.polatis.scpi import ScpiInterface
 
 
 DEFAULT_LISTEN_PORT = 25025
+KEEPALIVE_INTERVAL = 20  # Below SESSION_POOL check interval, so requests skip the health check
 
 SERVER_IP = subprocess.run(["hostname", "-I"], stdout=subprocess.PIPE).stdout.decode("utf-8").split(' ')[0]
 
@@ -23,10 +27,140 @@ LOGGER.addHandler(console_handler)
 LOGGER.setLevel(logging.DEBUG)
 
 
+class DeviceLanes(object):
+    """
+    Runs the blocking SCPI calls out of the IOLoop thread, in one
+    single-thread executor per device address ``(ip, port)``, so devices
+    sharing an ip get their own lane: the operations on the same OXC are
+    executed in order, while different OXCs are operated in parallel, and a
+    slow/unreachable device never stalls the requests for other devices.
+    """
+
+    def __init__(self):
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def run(self, address, function):
+        """Awaitable result of ``function()`` executed in the device lane"""
+        return tornado.ioloop.IOLoop.current().run_in_executor(
+            self._lane(address), function
+        )
+
+    def shutdown(self):
+        with self._lock:
+            lanes, self._lanes = self._lanes, {}
+        for lane in lanes.values():
+            lane.shutdown(wait=False)
+
+    def _lane(self, address):
+        with self._lock:
+            lane = self._lanes.get(address)
+            if lane is None:
+                lane = self._lanes[address] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='oxc-{}:{}'.format(*address)
+                )
+            return lane
+
+
+DEVICE_LANES = DeviceLanes()
+
+
+def _device_address(polatis_dict, oxc_ip=None, oxc_name=None):
+    """(ip, SCPI port) of the OXC given its ip or its name in the inventory,
+    using the port of the inventory if known (the default SCPI port if not)
+    """
+    if oxc_ip is None:
+        device = polatis_dict[oxc_name]
+    else:
+        device = next((d for d in polatis_dict.values() if d['ip'] == oxc_ip), {})
+    return oxc_ip or device['ip'], int(device.get('port') or ScpiInterface.PORT)
+
+
+def _check_inventory(polatis_dict):
+    """Raise ValueError naming the first invalid entry of the inventory"""
+    if not isinstance(polatis_dict, dict):
+        raise ValueError('The inventory must be a JSON object, not {}.'.format(
+            type(polatis_dict).__name__))
+    for name, device in polatis_dict.items():
+        if not isinstance(device, dict) or not isinstance(device.get('ip'), str):
+            raise ValueError('Device {!r}: expected {{"ip": "...", "port": ...}}, got {!r}.'.format(name, device))
+        try:
+            int(device.get('port') or ScpiInterface.PORT)
+        except (TypeError, ValueError):
+            raise ValueError('Device {!r}: invalid port {!r}.'.format(name, device['port']))
+
+
+def _warm(oxc):
+    oxc.sync()
+    oxc.metadata  # Retrieved once, so '/power' does not pay for '*idn?'
+
+
+class WarmSessions(object):
+    """
+    Opens one pooled session per device of the inventory at startup and keeps
+    them warm, sending a ``*opc?`` every ``interval`` seconds in the device
+    lane (an ``interval`` of 0 or less disables the keepalive, the sessions
+    are just opened at startup). Requests then find an open, recently checked
+    session and cost a single SCPI round trip.
+    """
+
+    def __init__(self, polatis_dict, interval=KEEPALIVE_INTERVAL):
+        self.polatis_dict = polatis_dict
+        self.interval = interval
+        self._pending = set()  # Devices whose previous keepalive is still running
+        self._callback = None
+
+    def start(self):
+        if len(self.polatis_dict) > SESSION_POOL.MAX_SESSIONS:
+            LOGGER.warning(
+                'Inventory has {} devices, only {} sessions are kept open.'.format(
+                    len(self.polatis_dict), SESSION_POOL.MAX_SESSIONS
+                )
+            )
+        self.ping(warm_up=True)
+        if self.interval > 0:
+            self._callback = tornado.ioloop.PeriodicCallback(self.ping, self.interval * 1000)
+            self._callback.start()
+
+    def stop(self):
+        if self._callback:
+            self._callback.stop()
+            self._callback = None
+
+    def ping(self, warm_up=False):
+        for name, device in self.polatis_dict.items():
+            if name not in self._pending:
+                self._pending.add(name)
+                tornado.ioloop.IOLoop.current().spawn_callback(
+                    self._ping, name, device, _warm if warm_up else lambda oxc: oxc.sync()
+                )
+
+    async def _ping(self, name, device, function):
+        address = _device_address(self.polatis_dict, oxc_name=name)
+        try:
+            await DEVICE_LANES.run(
+                address, lambda: SESSION_POOL.call(address[0], function, address[1])
+            )
+            LOGGER.debug('Session with Oxc {} ({}:{}) is warm.'.format(name, *address))
+        except Exception:
+            LOGGER.warning('Oxc {} ({}:{}) is not responding.'.format(name, *address))
+        finally:
+            self._pending.discard(name)
+
+
 class BaseHandler(tornado.web.RequestHandler):
     def initialize(self, polatis_dict):
         self.polatis_dict = polatis_dict
 
+    def _run(self, address, function):
+        """Run ``function(oxc)`` with the pooled session of the OXC at
+        ``address`` (ip, port), in the device lane (see ``DeviceLanes``)
+        """
+        host, port = address
+        return DEVICE_LANES.run(
+            address, lambda: SESSION_POOL.call(host, function, port)
+        )
+
     def _decode_json(self):
         try:
             return json_decode(self.request.body)
@@ -34,9 +168,9 @@ class BaseHandler(tornado.web.RequestHandler):
             LOGGER.warning('Handler exception. No JSON data.')
             self.write('Handler exception. No JSON data.')
 
-    def _map_oxc_ip(self, data_dict):
+    def _map_oxc_address(self, data_dict):
         '''
-            # ip has priority over name
+            (ip, SCPI port) of the OXC, ip has priority over name
             data {
                 'oxc_name': 'chavo'/'chapulin',
                 'oxc_ip': 'ip',
@@ -44,42 +178,40 @@ class BaseHandler(tornado.web.RequestHandler):
             }
         '''
         if 'oxc_ip' in data_dict:
-            oxc_ip = data_dict['oxc_ip']
-        elif 'oxc_name' in data_dict:
-            oxc_ip  = self.polatis_dict[data_dict['oxc_name']]['ip']
-        return oxc_ip
+            return _device_address(self.polatis_dict, oxc_ip=data_dict['oxc_ip'])
+        return _device_address(self.polatis_dict, oxc_name=data_dict['oxc_name'])
 
     # Polatis OXC methods
-    def _check_oxc_connectivity(self, oxc_ip):
-        LOGGER.info('Checking connectivity to Oxc {}'.format(oxc_ip))
+    async def _check_oxc_connectivity(self, address):
+        LOGGER.info('Checking connectivity to Oxc {}:{}'.format(*address))
         try:
-            response = Oxc(oxc_ip).idn
+            response = await self._run(address, lambda oxc: oxc.idn)
         except:
             response = 'Failed.'
 
         LOGGER.info(response)
         return response
     
-    def _get_oxc_connections(self, oxc_ip):
-        LOGGER.info('Getting Oxc {} connections.'.format(oxc_ip))
+    async def _get_oxc_connections(self, address):
+        LOGGER.info('Getting Oxc {}:{} connections.'.format(*address))
         try:
-            response = Oxc(oxc_ip).connections
+            response = await self._run(address, lambda oxc: oxc.connections)
         except:
             response = 'Failed.'
 
         LOGGER.info(response)
         return response
 
-    def _connect_OXC(self, oxc_ip, connection_dict):
+    async def _connect_OXC(self, address, connection_dict):
         if not isinstance(connection_dict, dict):
             response = 'Failed. The connections must come in a dictionary.'
             LOGGER.error(response)
             return response
 
-        LOGGER.info('Adding the following cross-connections on OXC {}'.format(oxc_ip))
+        LOGGER.info('Adding the following cross-connections on OXC {}:{}'.format(*address))
         LOGGER.info('Cross-connections: {}'.format(connection_dict))
         try:
-            Oxc(oxc_ip).connect(connection_dict)
+            await self._run(address, lambda oxc: oxc.connect(connection_dict))
             response = 'Ok.'
         except:
             response = 'Failed.'
@@ -87,16 +219,16 @@ class BaseHandler(tornado.web.RequestHandler):
         LOGGER.info(response)
         return response
 
-    def _disconnect_OXC(self, oxc_ip, connection_dict):
+    async def _disconnect_OXC(self, address, connection_dict):
         if not isinstance(connection_dict, dict):
             response = 'Failed. The connections must come in a dictionary.'
             LOGGER.error(response)
             return response
 
-        LOGGER.info('Removing the following cross-connections on OXC {}'.format(oxc_ip))
+        LOGGER.info('Removing the following cross-connections on OXC {}:{}'.format(*address))
         LOGGER.info('Cross-connections: {}'.format(connection_dict))
         try:
-            Oxc(oxc_ip).disconnect(connection_dict)
+            await self._run(address, lambda oxc: oxc.disconnect(connection_dict))
             response = 'Ok.'
         except:
             response = 'Failed.'
@@ -104,10 +236,10 @@ class BaseHandler(tornado.web.RequestHandler):
         LOGGER.info(response)
         return response
 
-    def _disconnect_all_OXC(self, oxc_ip):
-        LOGGER.info('Disconnecting all Oxc {} connections.'.format(oxc_ip))
+    async def _disconnect_all_OXC(self, address):
+        LOGGER.info('Disconnecting all Oxc {}:{} connections.'.format(*address))
         try:
-            Oxc(oxc_ip).disconnect_all()
+            await self._run(address, lambda oxc: oxc.disconnect_all())
             response = 'Ok.'
         except:
             response = 'Failed.'
@@ -115,15 +247,15 @@ class BaseHandler(tornado.web.RequestHandler):
         LOGGER.info(response)
         return response
 
-    def _get_power_OXC(self, oxc_ip, port_list):
+    async def _get_power_OXC(self, address, port_list):
         if not isinstance(port_list, list):
             response = 'Failed. The ports must come in a list.'
             LOGGER.error(response)
             return response
         
-        LOGGER.info('Getting Oxc {} power of the following ports: {}.'.format(oxc_ip, port_list))
+        LOGGER.info('Getting Oxc {}:{} power of the following ports: {}.'.format(*address, port_list))
         try:
-            response = Oxc(oxc_ip).get_power(port_list)
+            response = await self._run(address, lambda oxc: oxc.get_power(port_list))
         except:
             response = 'Failed.'
 
@@ -142,10 +274,10 @@ class MainHandler(BaseHandler):
 
 
 class IdnHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
-        oxc_ip = self._map_oxc_ip(data_dict)
-        resp = self._check_oxc_connectivity(oxc_ip)
+        address = self._map_oxc_address(data_dict)
+        resp = await self._check_oxc_connectivity(address)
         response_dict = {
             'response': resp
         }
@@ -153,10 +285,10 @@ class IdnHandler(BaseHandler):
 
 
 class ConnectionsHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
-        oxc_ip = self._map_oxc_ip(data_dict)
-        resp = self._get_oxc_connections(oxc_ip)
+        address = self._map_oxc_address(data_dict)
+        resp = await self._get_oxc_connections(address)
         response_dict = {
             'response': resp
         }
@@ -164,12 +296,12 @@ class ConnectionsHandler(BaseHandler):
 
 
 class ConnectHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
 
         if 'connection_dict' in data_dict:
-            oxc_ip = self._map_oxc_ip(data_dict)
-            resp = self._connect_OXC(oxc_ip, data_dict['connection_dict'])
+            address = self._map_oxc_address(data_dict)
+            resp = await self._connect_OXC(address, data_dict['connection_dict'])
         else:
             resp = 'Failed. You must send a dictionary containing the connections.'
             LOGGER.warning(resp)
@@ -181,12 +313,12 @@ class ConnectHandler(BaseHandler):
 
 
 class DisconnectHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
 
         if 'connection_dict' in data_dict:
-            oxc_ip = self._map_oxc_ip(data_dict)
-            resp = self._disconnect_OXC(oxc_ip, data_dict['connection_dict'])
+            address = self._map_oxc_address(data_dict)
+            resp = await self._disconnect_OXC(address, data_dict['connection_dict'])
         
         else:
             resp = 'Failed. You must send a dictionary containing the connections.'
@@ -199,10 +331,10 @@ class DisconnectHandler(BaseHandler):
 
 
 class DisconnectAllHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
-        oxc_ip = self._map_oxc_ip(data_dict)
-        resp = self._disconnect_all_OXC(oxc_ip)
+        address = self._map_oxc_address(data_dict)
+        resp = await self._disconnect_all_OXC(address)
         response_dict = {
             'response': resp
         }
@@ -210,12 +342,12 @@ class DisconnectAllHandler(BaseHandler):
 
 
 class PowerHandler(BaseHandler):
-    def post(self):
+    async def post(self):
         data_dict = self._decode_json()
 
         if 'port_list' in data_dict:
-            oxc_ip = self._map_oxc_ip(data_dict)
-            resp = self._get_power_OXC(oxc_ip, data_dict['port_list'])
+            address = self._map_oxc_address(data_dict)
+            resp = await self._get_power_OXC(address, data_dict['port_list'])
         else:
             resp = 'Failed. You must send a list containing the ports.'
             LOGGER.warning(resp)
@@ -225,8 +357,21 @@ class PowerHandler(BaseHandler):
         }
         self.write(response_dict)
 
-def setup_server():
-    # if you have any configuration to be done, use the polatis_dict to send the values.
+def setup_server(config=None):
+    '''
+        Device inventory, read from the JSON file ``config`` if given:
+        {
+            'name': {'ip': 'ip', 'port': 'scpi port'},
+            ...
+        }
+    '''
+    if config:
+        with open(config) as fp:
+            polatis_dict = json.load(fp)
+        _check_inventory(polatis_dict)
+        LOGGER.info('Loaded {} devices from {}'.format(len(polatis_dict), config))
+        return polatis_dict
+
     polatis_dict = {
         'Chavo': {
             'ip': '10.68.100.3',
@@ -240,8 +385,9 @@ def setup_server():
     return polatis_dict
 
 
-def make_app():
-    polatis_dict = setup_server()
+def make_app(polatis_dict=None):
+    if polatis_dict is None:
+        polatis_dict = setup_server()
     urls = [
         (r"/", MainHandler, dict(polatis_dict=polatis_dict)),
         (r"/idn", IdnHandler, dict(polatis_dict=polatis_dict)),
@@ -261,15 +407,35 @@ def make_app():
     default=DEFAULT_LISTEN_PORT,
     help="Listen port. Default port is {}.".format(DEFAULT_LISTEN_PORT)
 )
+@option(
+    "-c",
+    "--config",
+    default=None,
+    type=Path(exists=True, dir_okay=False),
+    help="JSON file with the device inventory ({\"name\": {\"ip\": ..., \"port\": ...}})."
+)
+@option(
+    "-k",
+    "--keepalive",
+    default=KEEPALIVE_INTERVAL,
+    help="Seconds between keepalive *opc? per device, 0 disables it. Default is {}.".format(KEEPALIVE_INTERVAL)
+)
 def main(
-    port=DEFAULT_LISTEN_PORT
+    port=DEFAULT_LISTEN_PORT,
+    config=None,
+    keepalive=KEEPALIVE_INTERVAL
 ):
     """
     Polatis OXC REST server.
     Offers an interface to control the Polatis OXCs using requests.
     """
-    app = make_app()
+    try:
+        polatis_dict = setup_server(config)
+    except ValueError as ex:
+        raise BadParameter('{}: {}'.format(config, ex), param_hint="'-c' / '--config'")
+    app = make_app(polatis_dict)
     app.listen(port)
+    WarmSessions(polatis_dict, keepalive).start()
     LOGGER.info("Server ready, listening on {}:{}".format(SERVER_IP, port))
     tornado.ioloop.IOLoop.current().start()
 
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Process-wide pool of long-lived SCPI sessions.
+
+Opening a new :obj:`~devicecontrol.polatis.Oxc` for every operation costs a
+TCP handshake plus a ``*opc?`` synchronization before the real command is
+sent, and the devices accept just a few simultaneous sessions. The
+:obj:`SessionPool` keeps one session per ``(host, port)`` and hands it out
+again and again::
+
+    from devicecontrol.polatis.pool import SESSION_POOL
+
+    with SESSION_POOL.session("192.168.0.3") as oxc:
+        oxc.connections
+
+    # Or, reconnecting transparently if the device dropped the connection:
+    SESSION_POOL.call("192.168.0.3", lambda oxc: oxc.connections)
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import monotonic
+
+from . import Oxc
+from .scpi import ScpiDisconnected, ScpiError, ScpiInterface
+
+
+class SessionPoolExhausted(ScpiError):
+    """All the sessions in the pool are in use"""
+
+
+class _Entry(object):
+    """Session managed by the pool, with its bookkeeping"""
+
+    def __init__(self, key, session):
+        self.key = key
+        self.session = session
+        self.lock = threading.Lock()  # Serializes the health checks
+        self.leases = 0
+        self.last_used = monotonic()
+
+
+class SessionPool(object):
+    """Hands out long-lived, health-checked sessions, one per ``(host, port)``
+
+    Arguments
+        factory: callable receiving ``host`` and ``port`` and returning a
+            new (not yet connected) session. :obj:`~devicecontrol.polatis.Oxc`
+            by default.
+        max_sessions: maximum number of sessions kept open at the same time.
+            When the limit is reached, the least recently used idle session
+            is evicted.
+        idle_timeout: number of seconds a session can stay unused before
+            being evicted.
+        check_interval: sessions unused for longer than this number of
+            seconds are checked with ``*opc?`` (and reconnected if necessary)
+            before being handed out.
+        wait_timeout: maximum number of seconds waiting for a session to be
+            released when the pool is full.
+    """
+
+    MAX_SESSIONS = 16
+    IDLE_TIMEOUT = 300
+    CHECK_INTERVAL = 30
+    WAIT_TIMEOUT = ScpiInterface.TIMEOUT
+
+    def __init__(
+        self,
+        factory=None,
+        max_sessions=MAX_SESSIONS,
+        idle_timeout=IDLE_TIMEOUT,
+        check_interval=CHECK_INTERVAL,
+        wait_timeout=WAIT_TIMEOUT,
+        logger=None,
+    ):
+        self._factory = factory or Oxc
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._check_interval = check_interval
+        self._wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # Least recently used first
+        self._condition = threading.Condition()
+        self._logger = logger or logging.getLogger(__name__)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, address):
+        return _key(*address) in self._entries
+
+    @contextmanager
+    def session(self, host, port=None):
+        """Context manager that leases the session associated with the given
+        address.
+
+        The same session is shared by all the threads leasing it (the requests
+        are serialized by the session itself), and it is not evicted while
+        leased.
+        """
+        entry = self._checkout(_key(host, port))
+        try:
+            with entry.lock:
+                self._check(entry)
+            yield entry.session
+        finally:
+            entry.last_used = monotonic()
+            self._checkin(entry)
+
+    def call(self, host, function, port=None):
+        """Run ``function(session)`` with the session associated with the given
+        address.
+
+        If the device dropped the connection, the session is re-established
+        and the function is called once more.
+        """
+        with self.session(host, port) as session:
+            try:
+                return function(session)
+            except ScpiDisconnected:
+                self._logger.info("Reconnecting to %r", session.address)
+                session.reconnect_session()
+                return function(session)
+
+    def evict(self, host, port=None):
+        """Close and remove the session associated with the given address.
+
+        Sessions currently in use are closed as soon as they are released.
+        """
+        with self._condition:
+            entry = self._entries.pop(_key(host, port), None)
+            if entry and entry.leases == 0:
+                entry.session.close()
+
+    def clear(self):
+        """Close and remove all the sessions"""
+        for key in list(self._entries):
+            self.evict(*key)
+
+    def _checkout(self, key):
+        deadline = monotonic() + self._wait_timeout
+        with self._condition:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            while entry is None and len(self._entries) >= self._max_sessions:
+                if not self._evict_lru():
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise SessionPoolExhausted
+                    self._condition.wait(remaining)
+                entry = self._entries.get(key)
+
+            if entry is None:
+                entry = self._entries[key] = _Entry(key, self._factory(*key))
+            self._entries.move_to_end(key)
+            entry.leases += 1
+            return entry
+
+    def _checkin(self, entry):
+        with self._condition:
+            entry.leases -= 1
+            if entry.leases == 0 and self._entries.get(entry.key) is not entry:
+                # Evicted while in use
+                entry.session.close()
+            self._condition.notify_all()
+
+    def _evict_idle(self):
+        limit = monotonic() - self._idle_timeout
+        for key, entry in list(self._entries.items()):
+            if entry.leases == 0 and entry.last_used < limit:
+                self._logger.debug("Evicting idle session %r", key)
+                self._close(key)
+
+    def _evict_lru(self):
+        for key, entry in self._entries.items():
+            if entry.leases == 0:
+                self._logger.debug("Evicting least recently used session %r", key)
+                self._close(key)
+                return True
+        return False
+
+    def _close(self, key):
+        entry = self._entries.pop(key)
+        entry.session.close()
+
+    def _check(self, entry):
+        session = entry.session
+        if session.connected and monotonic() - entry.last_used > self._check_interval:
+            try:
+                session.sync()
+            except (ScpiError, OSError):
+                self._logger.info("Reconnecting to %r", session.address)
+                session.reconnect_session()
+
+
+def _key(host, port=None):
+    return (host, int(port or ScpiInterface.PORT))
+
+
+SESSION_POOL = SessionPool()
+"""Pool shared by the whole process"""
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compact results indexed by port number.
+
+:obj:`PortArray` (power levels) and :obj:`ConnectionArray` (cross-connects)
+store the values in an :obj:`array.array` covering a contiguous range of
+ports, instead of a dict of boxed ints and floats. They are read-only
+:obj:`~collections.abc.Mapping`, so they can be used where the dicts returned
+by :obj:`~devicecontrol.polatis.Oxc` are expected::
+
+    oxc = Oxc(IP_ADDR, compact_results=True)
+    power = oxc.power
+    power[193]
+    # => -29.55
+    power[193:385]  # Ports 193 to 384
+    # => PortArray({193: -29.55, 194: -30.05, ...})
+    power.diff(previous, tolerance=0.5)
+    # => [194]
+    PortArray.from_bytes(power.to_bytes()) == power
+    # => True
+"""
+import math
+import struct
+import sys
+from abc import abstractmethod
+from array import array
+from collections.abc import Mapping
+
+_HEADER = struct.Struct("<cI")  # Type code and first port
+
+
+class _PortIndexed(Mapping):
+    """Read-only mapping port => value backed by an array, where the value of
+    the port ``first + i`` is stored at the position ``i``.
+
+    Ports without value hold the ``MISSING`` marker. Subclasses define
+    ``TYPECODE``, ``MISSING`` and how the marker is recognized (``_missing``).
+    """
+
+    TYPECODE = None
+    MISSING = None
+
+    def __init__(self, first=1, values=()):
+        if not isinstance(values, array) or values.typecode != self.TYPECODE:
+            values = array(self.TYPECODE, values)
+        self._first = first
+        self._values = values
+        self._len = sum(1 for value in values if not self._missing(value))
+
+    @classmethod
+    def from_ports(cls, ports, values):
+        """Build from a list of ports and the list of their values"""
+        ports = list(ports)
+        if not ports:
+            return cls()
+        first = min(ports)
+        array_ = array(cls.TYPECODE, [cls.MISSING]) * (max(ports) - first + 1)
+        for port, value in zip(ports, values):
+            array_[port - first] = value
+        return cls(first, array_)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Build from a dict relating ports and values"""
+        if isinstance(mapping, cls):
+            return mapping
+        return cls.from_ports(mapping.keys(), mapping.values())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of ``to_bytes``"""
+        typecode, first = _HEADER.unpack_from(data)
+        if typecode.decode("ascii") != cls.TYPECODE:
+            raise ValueError("Not a serialized {}".format(cls.__name__))
+        values = array(cls.TYPECODE)
+        values.frombytes(data[_HEADER.size :])  # noqa
+        if sys.byteorder == "big":
+            values.byteswap()
+        return cls(first, values)
+
+    @property
+    def first(self):
+        """First port of the range covered by the array"""
+        return self._first
+
+    @property
+    def values_array(self):
+        """Read-only view of the underlying array"""
+        return memoryview(self._values).toreadonly()
+
+    def __getitem__(self, port):
+        if isinstance(port, slice):
+            return self._slice(port)
+        try:
+            index = port - self._first
+        except TypeError:
+            raise KeyError(port) from None
+        if 0 <= index < len(self._values):
+            value = self._values[index]
+            if not self._missing(value):
+                return value
+        raise KeyError(port)
+
+    def __iter__(self):
+        first, missing = self._first, self._missing
+        return (first + i for i, value in enumerate(self._values) if not missing(value))
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.to_dict())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def to_bytes(self):
+        """Compact binary representation (little-endian)"""
+        values = self._values
+        if sys.byteorder == "big":
+            values = array(self.TYPECODE, values)
+            values.byteswap()
+        header = _HEADER.pack(self.TYPECODE.encode("ascii"), self._first)
+        return header + values.tobytes()
+
+    def diff(self, other):
+        """Sorted list of ports whose values are not the same in both
+        (including the ports with value in just one of them)
+        """
+        return self._diff(other, lambda a, b: a != b)
+
+    def _diff(self, other, differ):
+        first, pairs = self._aligned(self.from_mapping(other))
+        return [first + i for i, (a, b) in enumerate(pairs) if differ(a, b)]
+
+    def _aligned(self, other):
+        """First port and pairs of values of the range covering both"""
+        if not other._values:
+            return self._first, ((value, self.MISSING) for value in self._values)
+        if not self._values:
+            return other._first, ((self.MISSING, value) for value in other._values)
+        first = min(self._first, other._first)
+        last = max(self._last, other._last)
+        return first, zip(self._padded(first, last), other._padded(first, last))
+
+    @property
+    def _last(self):
+        return self._first + len(self._values) - 1
+
+    def _padded(self, first, last):
+        if first == self._first and last == self._last:
+            return self._values
+        before = array(self.TYPECODE, [self.MISSING]) * (self._first - first)
+        after = array(self.TYPECODE, [self.MISSING]) * (last - self._last)
+        return before + self._values + after
+
+    def _slice(self, ports):
+        if ports.step not in (None, 1):
+            raise ValueError("Port ranges do not support steps")
+        start = self._first if ports.start is None else max(ports.start, self._first)
+        stop = self._last + 1 if ports.stop is None else ports.stop
+        if stop <= start:
+            return type(self)()
+        return type(self)(
+            start, self._values[start - self._first : stop - self._first]  # noqa
+        )
+
+    @staticmethod
+    @abstractmethod
+    def _missing(value):
+        """Whether ``value`` is the ``MISSING`` marker"""
+
+
+class PortArray(_PortIndexed):
+    """Power levels (dBm) indexed by port number, stored as doubles.
+
+    Ports without reading hold ``nan``.
+    """
+
+    TYPECODE = "d"
+    MISSING = math.nan
+
+    def diff(self, other, tolerance=0.0):
+        """Sorted list of ports whose power levels differ more than
+        ``tolerance`` dB (including the ports read in just one of them)
+        """
+
+        def _differ(a, b):
+            if a != a or b != b:  # nan
+                return (a != a) != (b != b)
+            return abs(a - b) > tolerance
+
+        return self._diff(other, _differ)
+
+    @staticmethod
+    def _missing(value):
+        return value != value
+
+
+class ConnectionArray(_PortIndexed):
+    """Cross-connects (input => output port) indexed by input port, stored as
+    unsigned shorts.
+
+    Unconnected ports hold ``0``.
+    """
+
+    TYPECODE = "H"
+    MISSING = 0
+
+    @staticmethod
+    def _missing(value):
+        return value == 0
@@ -5,15 +5,35 @@
 The main class in this module (:obj:`~.ScpiInterface`) can be used as parent
 class for implementing communication with different devices.
 """
+import asyncio
 import gc
 import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
 from functools import wraps
-from socket import AF_INET, SOCK_STREAM, socket
+from heapq import heapify, heappush
+from itertools import count
+from time import perf_counter
+from socket import AF_INET, SHUT_RDWR, SOCK_STREAM, socket
+from socket import timeout as SocketTimeout
 
 from pexpect import EOF, TIMEOUT
 from pexpect.fdpexpect import fdspawn
 
 from .lib import attr_reader, memoized
+from .transport import BufferedSession
+
+_TIMEOUT_ERRORS = (TIMEOUT, SocketTimeout)
+_DISCONNECTION_ERRORS = (ConnectionError, EOF, EOFError)
+# A response exceeding the stream limit leaves the reader in an unknown state,
+# so the session has to be re-established, like after a disconnection
+_ASYNC_DISCONNECTION_ERRORS = (
+    ConnectionError,
+    asyncio.IncompleteReadError,
+    asyncio.LimitOverrunError,
+)
 
 
 class ScpiError(RuntimeError):
@@ -32,23 +52,218 @@ class ScpiDisconnected(ScpiError):
 
 
 def translate_exceptions(method):
-    """Translate pexpect excetions to the SCPI domain"""
+    """Translate pexpect/socket excetions to the SCPI domain"""
 
     @wraps(method)
     def _guarded(self, *args, **kwargs):
         try:
             return method(self, *args, **kwargs)
-        except TIMEOUT as ex:
+        except _TIMEOUT_ERRORS as ex:
             self._logger.error(ScpiTimeout.__doc__, exc_info=True)
             raise ScpiTimeout from ex
-        except (ConnectionError, EOF) as ex:
+        except _DISCONNECTION_ERRORS as ex:
             self._logger.error(ScpiDisconnected.__doc__, exc_info=True)
             raise ScpiDisconnected from ex
 
     return _guarded
 
 
-@attr_reader("address", "timeout")
+ScpiEvent = namedtuple(
+    "ScpiEvent", "verb address sent received elapsed outcome retries"
+)
+ScpiEvent.__doc__ = """Message exchanged with a device, as reported to observers
+
+    verb: first word of the message, in lower case (e.g. ``:pmon:pow?``).
+        For a burst (e.g. a :obj:`ScpiBatch`), the verb shared by all its
+        messages, or ``"burst"`` if they have different verbs
+    address: tuple (host, port) of the device
+    sent: number of bytes sent
+    received: number of bytes received
+    elapsed: wall time in seconds, including the trailing ``*opc?``
+    outcome: ``"ok"``, ``"timeout"``, ``"disconnected"`` or ``"error"``
+    retries: number of times the response marker was looked for again after a
+        timeout
+"""
+
+_OUTCOMES = ((ScpiTimeout, "timeout"), (ScpiDisconnected, "disconnected"))
+_SYNC_LENGTH = len("\r\n*opc?\n")
+
+# Bytes received and retries of the message being exchanged by each thread
+_exchange = threading.local()
+
+
+def instrumented(method):
+    """Report the messages exchanged by the method to the observers of the
+    SCPI interface (see :obj:`ScpiEvent`).
+
+    When there is no observer, the method is called directly.
+    """
+
+    @wraps(method)
+    def _instrumented(self, message, *args, **kwargs):
+        if not self._observers:
+            return method(self, message, *args, **kwargs)
+
+        record = _exchange.record = [0, 0]  # Bytes received, retries
+        outcome = "ok"
+        start = perf_counter()
+        try:
+            return method(self, message, *args, **kwargs)
+        except BaseException as ex:
+            outcome = next((o for e, o in _OUTCOMES if isinstance(ex, e)), "error")
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            _exchange.record = None
+            if isinstance(message, str):
+                verb, sent = _verb(message), len(message)
+            else:
+                verbs = {_verb(m) for m in message}
+                verb = verbs.pop() if len(verbs) == 1 else "burst"
+                sent = sum(len(m) + 2 for m in message)
+            event = ScpiEvent(
+                verb,
+                self.address,
+                sent + _SYNC_LENGTH,
+                record[0],
+                elapsed,
+                outcome,
+                record[1],
+            )
+            for observer in self._observers:
+                try:
+                    observer(event)
+                except Exception:
+                    self._logger.exception("Error in SCPI observer %r", observer)
+
+    return _instrumented
+
+
+def _verb(message):
+    return message.split(" ", 1)[0].lower()
+
+
+def _account(received, retries=0):
+    """Record the bytes received by the current thread for the observers"""
+    record = getattr(_exchange, "record", None)
+    if record is not None:
+        record[0] += received
+        record[1] += retries
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class RequestQueue(object):
+    """Serialize the access to a session shared between threads.
+
+    Requests are served in FIFO order, but requests with higher priority
+    (lower number) overtake the ones waiting with lower priority.
+    The same thread can re-enter the queue while it is being served.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = []  # Heap of (priority, ticket)
+        self._tickets = count()
+        self._owner = None
+        self._depth = 0
+
+    def __len__(self):
+        """Number of requests waiting"""
+        return len(self._waiting)
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_NORMAL):
+        """Context manager that waits for the turn of the current thread"""
+        thread = threading.get_ident()
+        with self._condition:
+            if self._owner != thread:
+                request = (priority, next(self._tickets))
+                heappush(self._waiting, request)
+                try:
+                    while self._owner is not None or self._waiting[0] != request:
+                        self._condition.wait()
+                finally:
+                    # Interrupted waiters must not block the ones behind them
+                    self._waiting.remove(request)
+                    heapify(self._waiting)
+                    self._condition.notify_all()
+                self._owner = thread
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if not self._depth:
+                    self._owner = None
+                    self._condition.notify_all()
+
+
+def _has_commands(messages, number_of_responses):
+    """Whether a burst includes commands (each query produces one response)"""
+    return number_of_responses < len(messages)
+
+
+def serialized(state_changing=False):
+    """Run the method in the turn of the current thread in the request queue
+    of the SCPI interface.
+
+    The decorated method accepts an extra ``priority`` keyword argument. By
+    default, state-changing methods get high priority when the interface is
+    created with ``prioritize_commands=True``. ``state_changing`` can also be
+    a callable receiving the arguments of the method, for methods whose
+    effect depends on them.
+    """
+
+    def _decorator(method):
+        @wraps(method)
+        def _serialized(self, *args, priority=None, **kwargs):
+            if priority is None:
+                priority = PRIORITY_NORMAL
+                changing = state_changing
+                if callable(changing):
+                    changing = changing(*args, **kwargs)
+                if changing and self._prioritize_commands:
+                    priority = PRIORITY_HIGH
+            with self._requests.slot(priority):
+                return method(self, *args, **kwargs)
+
+        return _serialized
+
+    return _decorator
+
+
+def translate_async_exceptions(method):
+    """Translate asyncio excetions to the SCPI domain"""
+
+    @wraps(method)
+    async def _guarded(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        except asyncio.TimeoutError as ex:
+            self._logger.error(ScpiTimeout.__doc__, exc_info=True)
+            raise ScpiTimeout from ex
+        except _ASYNC_DISCONNECTION_ERRORS as ex:
+            self._logger.error(ScpiDisconnected.__doc__, exc_info=True)
+            raise ScpiDisconnected from ex
+
+    return _guarded
+
+
+def _pexpect_session(sock, timeout):
+    return fdspawn(sock.fileno(), timeout=timeout)
+
+
+TRANSPORTS = {"pexpect": _pexpect_session, "buffered": BufferedSession}
+"""Factories for the objects used by :obj:`ScpiInterface` to exchange messages
+with the device, given a connected socket and a timeout
+"""
+
+
+@attr_reader("address", "timeout", "transport")
 class ScpiInterface:
     """SCPI communication channel based on pexpect
 
@@ -60,6 +275,10 @@ class ScpiInterface:
     synchronize the communication with the device.
     Additionally all the responses are expected to be a single line.
 
+    The same object can be shared between threads: each message (and its
+    ``*opc?``) is exchanged in turn, following the :obj:`RequestQueue` of the
+    session.
+
     Arguments
     ---------
     host : str
@@ -69,14 +288,43 @@ class ScpiInterface:
         5025 by default.
     timeout : float
         Maximum number of seconds waiting for a response from the device
+    transport : str
+        (Optional) Name of the transport used to exchange messages with the
+        device (one of the keys in :obj:`TRANSPORTS`): ``"pexpect"`` (by
+        default) or ``"buffered"`` (a lean line reader that avoids pexpect's
+        search buffers, see :obj:`~.transport.BufferedSession`).
+    observers : list
+        (Optional) Callables receiving a :obj:`ScpiEvent` for every message
+        exchanged with the device (e.g.
+        :obj:`~.instrumentation.LatencyHistogram`).
+    prioritize_commands : bool
+        (Optional) When ``True``, state-changing messages (commands and
+        bursts including commands) overtake the queries waiting for their
+        turn.
     """
 
     PORT = 5025  # Default port for SPCI
     TIMEOUT = 5  # Maximum delay accepted in seconds
-
-    def __init__(self, host, port=PORT, timeout=TIMEOUT, logger=None):
+    TRANSPORT = "pexpect"
+
+    def __init__(
+        self,
+        host,
+        port=PORT,
+        timeout=TIMEOUT,
+        logger=None,
+        transport=None,
+        observers=None,
+        prioritize_commands=False,
+    ):
         self._address = (host, port or self.PORT)
         self._timeout = timeout or self.TIMEOUT
+        self._transport = transport or self.TRANSPORT
+        if self._transport not in TRANSPORTS:
+            raise ValueError("Unknown SCPI transport: {}".format(self._transport))
+        self._observers = list(observers or [])
+        self._prioritize_commands = prioritize_commands
+        self._requests = RequestQueue()
         self._socket = None
         self._logger = logger or logging.getLogger(__name__)
 
@@ -91,25 +339,66 @@ class ScpiInterface:
         """Internal object used for communicating with the device"""
         self._socket = socket(AF_INET, SOCK_STREAM)
         self._socket.connect(self.address)
-        return _sync(fdspawn(self._socket.fileno(), timeout=self.timeout))
+        return _sync(TRANSPORTS[self.transport](self._socket, self.timeout))
 
-    def reconnect_session(self):
-        """Re-establish SCPI connection"""
-        try:
-            if self._socket:
-                self._socket.close()
-        except:  # noqa
-            pass
+    @property
+    def connected(self):
+        """``True`` if the SCPI connection was already established"""
+        return bool(getattr(self, "_session", None))
+
+    @serialized()
+    def close(self):
+        """Close the SCPI connection.
+
+        The connection is re-established on demand when the session is used.
+        """
+        # Delete cache to force reconnection
+        session = self.__dict__.pop("_session", None)
+        sock, self._socket = self._socket, None
         try:
-            # Delete cache to force reconnection
-            self._socket = None
-            self._session = None
-            delattr(self, "_session")
-            gc.collect()
+            if session:
+                session.close()
+                self._logger.debug("Session closed.")
+                if sock:
+                    # The file descriptor was already closed by the session
+                    sock.detach()
+            elif sock:
+                sock.close()
         except:  # noqa
             pass
+
+    def abort(self):
+        """Interrupt the request in progress, typically waiting in another
+        thread, which fails with :obj:`ScpiDisconnected`.
+
+        The connection is unusable afterwards: it has to be closed (or
+        re-established) once the interrupted request is over.
+        """
+        sock = self._socket
+        if sock:
+            try:
+                sock.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+
+    @serialized()
+    def reconnect_session(self):
+        """Re-establish SCPI connection"""
+        self.close()
+        gc.collect()
         return self.session
 
+    def add_observer(self, observer):
+        """Register a callable that receives a :obj:`ScpiEvent` for every
+        message exchanged with the device
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        self._observers.remove(observer)
+
+    @serialized()
+    @instrumented
     @translate_exceptions
     def query(self, message):
         """Send a message that requires a response to the device.
@@ -119,29 +408,65 @@ class ScpiInterface:
         # *OPC? is used to synchronize the device (it blocks until all the
         # pending requests are processed) and as a end-of-command marker
         # (always return 1)
+        session = self.session
         try:
             self._logger.debug("Query%r: %s", self.address, message)
-            self.session.sendline(message + "\r\n*opc?")
-            self.session.expect_exact("\r\n1\r\n")
-        except TIMEOUT as ex:
+            session.sendline(message + "\r\n*opc?")
+            session.expect_exact("\r\n1\r\n")
+            _account(len(session.before) + 5)
+        except _TIMEOUT_ERRORS as ex:
             try:
-                self.session.expect_exact("1\r\n")
+                session.expect_exact("1\r\n")
+                _account(len(session.before) + 3, retries=1)
             except:  # noqa
                 raise ex
 
-        response = self.session.before.strip().decode("utf-8")
+        response = _decode_response(session.before)
         self._logger.debug("Response: %s", response)
         return response
 
+    @serialized(state_changing=True)
+    @instrumented
     @translate_exceptions
     def command(self, message):
         """Send a messages to the device that triggers a side-effect.
 
         The device is expected to not send anything back.
         """
+        session = self.session
         self._logger.debug("Command%r: %s", self.address, message)
-        self.session.sendline(message + "\r\n*opc?")
-        self.session.expect_exact("1\r\n")
+        session.sendline(message + "\r\n*opc?")
+        session.expect_exact("1\r\n")
+        _account(len(session.before) + 3)
+
+    @serialized(state_changing=_has_commands)
+    @instrumented
+    @translate_exceptions
+    def burst(self, messages, number_of_responses):
+        """Send several messages at once, followed by a single ``*opc?``.
+
+        Each query in the burst is expected to produce a single line, and
+        the commands are expected to not send anything back.
+        Returns the list of responses in the order they were received.
+        """
+        session = self.session
+        self._logger.debug("Burst%r: %s", self.address, " | ".join(messages))
+        session.sendline("\r\n".join(messages) + "\r\n*opc?")
+        responses = []
+        for _ in range(number_of_responses):
+            session.expect_exact("\r\n")
+            _account(len(session.before) + 2)
+            responses.append(_decode_response(session.before))
+        session.expect_exact("1\r\n")
+        _account(len(session.before) + 3)
+        self._logger.debug("Responses: %s", " | ".join(responses))
+        return responses
+
+    def batch(self):
+        """Context manager that queues commands and queries and send them to
+        the device in a single burst (see :obj:`ScpiBatch`)
+        """
+        return ScpiBatch(self)
 
     @property
     def idn(self):
@@ -151,13 +476,252 @@ class ScpiInterface:
         """
         return tuple(self.query("*idn?").split(","))
 
+    @serialized()
+    @translate_exceptions
     def sync(self):
         """Ensure there is no pending message being processed/transmitted"""
         return _sync(self.session)
 
 
+class ScpiBatch(object):
+    """Queue of commands and queries to be sent to the device in a single burst
+
+    Instead of waiting for a ``*opc?`` round trip after each message, all the
+    queued messages are written at once followed by a single ``*opc?``, and
+    the responses are split back to each query. Every call returns a
+    :obj:`~concurrent.futures.Future`, resolved when the batch is flushed::
+
+        with device.batch() as batch:
+            idn = batch.query("*idn?")
+            batch.command("oxc:swit:disc:all")
+
+        idn.result()
+
+    The batch is flushed when the ``with`` block finishes without errors
+    (otherwise the queued messages are discarded and the futures cancelled).
+
+    Arguments
+    ---------
+    interface : ScpiInterface
+        Communication channel with the device
+    """
+
+    def __init__(self, interface):
+        self._interface = interface
+        self._queue = []  # (message, future, parser) - parser is None for commands
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def command(self, message):
+        """Queue a message that triggers a side-effect on the device"""
+        return self._enqueue(message, None)
+
+    def query(self, message, parser=str):
+        """Queue a message that requires a response from the device.
+
+        The response is transformed by ``parser`` before resolving the future.
+        """
+        return self._enqueue(message, parser)
+
+    def flush(self):
+        """Send all the queued messages and resolve the futures"""
+        queue, self._queue = self._queue, []
+        if not queue:
+            return
+
+        messages = [message for message, _, _ in queue]
+        number_of_queries = sum(1 for _, _, parser in queue if parser)
+        try:
+            responses = self._interface.burst(messages, number_of_queries)
+        except BaseException as ex:
+            for _, future, _ in queue:
+                future.set_exception(ex)
+            raise
+
+        # Futures are resolved in the same order the messages were queued
+        responses = iter(responses)
+        for _, future, parser in queue:
+            try:
+                future.set_result(parser(next(responses)) if parser else None)
+            except Exception as ex:
+                future.set_exception(ex)
+
+    def discard(self):
+        """Remove all the queued messages, cancelling their futures"""
+        queue, self._queue = self._queue, []
+        for _, future, _ in queue:
+            future.cancel()
+
+    def _enqueue(self, message, parser):
+        future = Future()
+        self._queue.append((message, future, parser))
+        return future
+
+
+@attr_reader("address", "timeout")
+class AsyncScpiInterface:
+    """SCPI communication channel based on asyncio streams
+
+    Asynchronous counterpart of :obj:`ScpiInterface`. The messages follow the
+    same ``*opc?`` framing, but the I/O is done by coroutines, so a single
+    event loop can drive many devices at once without a thread per device.
+    Requests sent through the same object are serialized.
+
+    Arguments
+    ---------
+    host : str
+        IP address of the device
+    port : int
+        (Optional) TCP port open in the device, waiting for connections.
+        5025 by default.
+    timeout : float
+        Maximum number of seconds waiting for a response from the device
+    """
+
+    PORT = ScpiInterface.PORT
+    TIMEOUT = ScpiInterface.TIMEOUT
+    LIMIT = 2 ** 20  # Maximum size of a single response in bytes
+
+    def __init__(self, host, port=PORT, timeout=TIMEOUT, logger=None):
+        self._address = (host, port or self.PORT)
+        self._timeout = timeout or self.TIMEOUT
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._logger = logger or logging.getLogger(__name__)
+
+    async def __aenter__(self):
+        await self.session()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    @property
+    def lock(self):
+        """Lock used to serialize the requests sent to the device"""
+        # Created lazily, so it is bound to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @translate_async_exceptions
+    async def session(self):
+        """Internal streams used for communicating with the device"""
+        async with self.lock:
+            return await self._session()
+
+    async def _session(self):
+        if self._writer is None:
+            streams = asyncio.open_connection(*self.address, limit=self.LIMIT)
+            reader, writer = await asyncio.wait_for(streams, self.timeout)
+            try:
+                await _async_sync(reader, writer, self.timeout)
+            except BaseException:
+                writer.close()
+                raise
+            self._reader, self._writer = reader, writer
+        return self._reader, self._writer
+
+    async def close(self):
+        """Close the SCPI connection"""
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._logger.debug("Session closed.")
+
+    async def reconnect_session(self):
+        """Re-establish SCPI connection"""
+        await self.close()
+        return await self.session()
+
+    @translate_async_exceptions
+    async def query(self, message):
+        """Send a message that requires a response to the device.
+
+        The response is expected to have just a single line
+        """
+        async with self.lock:
+            reader, writer = await self._session()
+            self._logger.debug("Query%r: %s", self.address, message)
+            writer.write((message + "\r\n*opc?\n").encode("utf-8"))
+            await asyncio.wait_for(writer.drain(), self.timeout)
+            try:
+                marker = b"\r\n1\r\n"
+                data = await asyncio.wait_for(reader.readuntil(marker), self.timeout)
+            except asyncio.TimeoutError as ex:
+                # The partial data is kept in the reader buffer when
+                # ``readuntil`` is cancelled, so we can look again for a
+                # shorter marker, like ``ScpiInterface.query`` does
+                try:
+                    marker = b"1\r\n"
+                    data = await asyncio.wait_for(
+                        reader.readuntil(marker), self.timeout
+                    )
+                except:  # noqa
+                    raise ex
+
+        response = data[: -len(marker)].strip().decode("utf-8")
+        self._logger.debug("Response: %s", response)
+        return response
+
+    @translate_async_exceptions
+    async def command(self, message):
+        """Send a messages to the device that triggers a side-effect.
+
+        The device is expected to not send anything back.
+        """
+        async with self.lock:
+            reader, writer = await self._session()
+            self._logger.debug("Command%r: %s", self.address, message)
+            writer.write((message + "\r\n*opc?\n").encode("utf-8"))
+            await asyncio.wait_for(writer.drain(), self.timeout)
+            await asyncio.wait_for(reader.readuntil(b"1\r\n"), self.timeout)
+
+    @property
+    async def idn(self):
+        """Awaitable tuple containing the device identification::
+
+            (<vendor>, <model number>, <serial number>, <software revision>)
+        """
+        return tuple((await self.query("*idn?")).split(","))
+
+    @translate_async_exceptions
+    async def sync(self):
+        """Ensure there is no pending message being processed/transmitted"""
+        async with self.lock:
+            reader, writer = await self._session()
+            await _async_sync(reader, writer, self.timeout)
+
+
+def _decode_response(data):
+    """Decode the bytes (or buffer) received from the device"""
+    return str(data, "utf-8").strip()
+
+
 def _sync(session):
     """Auxiliary function to avoid recursion when initializing the serial"""
     session.sendline("*opc?")
     session.expect_exact("1\r\n")
     return session
+
+
+async def _async_sync(reader, writer, timeout):
+    """Asynchronous equivalent of :func:`_sync`"""
+    writer.write(b"*opc?\n")
+    await asyncio.wait_for(writer.drain(), timeout)
+    await asyncio.wait_for(reader.readuntil(b"1\r\n"), timeout)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Simulated Polatis OXC for testing and benchmarking.
+
+The simulator listens on TCP and speaks the subset of SCPI used by this
+library (``*idn?``, ``*opc?``, ``oxc:swit:conn:stat?/add/sub/only``,
+``oxc:swit:disc:all``, ``:pmon:pow?`` and ``:syst:comm:netw:addr?``), so
+:obj:`~devicecontrol.polatis.Oxc`, :obj:`~devicecontrol.polatis.slicing.VirtualOxc`
+and ``oxc_server`` can be exercised without a real switch::
+
+    from devicecontrol.polatis import Oxc
+    from devicecontrol.polatis.sim import SimulatorThread
+
+    with SimulatorThread(count=100, latency=0.002, jitter=0.001) as sims:
+        oxcs = [Oxc(*address) for address in sims.addresses]
+        oxcs[0].connect({1: 193})
+
+Many simulated devices share a single event loop, so hundreds of them can
+run in one process. The simulators can also be started from the command
+line::
+
+    $ python -m devicecontrol.polatis.sim --count 10 --port 15025
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import threading
+
+from . import _decode_channels, _parse_number_of_ports
+from .scpi import ScpiInterface
+
+DEFAULT_PRODUCT_CODE = "N-VST-192x192-LU1-DMHNV-801"
+DARK = -60.0  # Power level reported by ports without light (dBm)
+INSERTION_LOSS = 1.5  # dB
+_CHANNEL_LIST = re.compile(r"\(@([^)]*)\)")
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SimulatedDevice(object):
+    """State of a simulated Polatis OXC, and the SCPI messages it understands
+
+    Arguments
+        product_code: model of the simulated device, following the Polatis
+            convention (e.g. ``N-VST-192x192-LU1-DMHNV-801``), which
+            determines the number of ports.
+        serial: serial number reported by ``*idn?``
+        ip: address reported by ``:syst:comm:netw:addr?``
+        seed: seed for the random power levels injected in the input ports
+    """
+
+    def __init__(
+        self,
+        product_code=DEFAULT_PRODUCT_CODE,
+        serial="000000",
+        ip="127.0.0.1",
+        seed=None,
+    ):
+        number_of_ports = _parse_number_of_ports(product_code)
+        if not number_of_ports:
+            raise ValueError("Invalid product code: {}".format(product_code))
+
+        self.product_code = product_code
+        self.serial = serial
+        self.ip = ip
+        self.number_of_ports = number_of_ports
+        self.connections = {}
+        rand = random.Random(seed)
+        self.input_power = {
+            port: round(rand.uniform(-8, -2), 2)
+            for port in range(1, number_of_ports[0] + 1)
+        }
+        self._handlers = {
+            "*idn?": self._idn,
+            "*opc?": lambda _: "1",
+            "oxc:swit:conn:stat?": self._stat,
+            "oxc:swit:conn:add": self._add,
+            "oxc:swit:conn:sub": self._sub,
+            "oxc:swit:conn:only": self._only,
+            "oxc:swit:disc:all": self._disconnect_all,
+            "pmon:pow?": self._power,
+            "syst:comm:netw:addr?": self._network,
+        }
+
+    @property
+    def inputs(self):
+        return range(1, self.number_of_ports[0] + 1)
+
+    @property
+    def outputs(self):
+        return range(self.number_of_ports[0] + 1, sum(self.number_of_ports) + 1)
+
+    def handle(self, message):
+        """Process a single SCPI message.
+
+        Returns the response (without line terminator), or ``None`` for
+        messages that don't produce a response.
+        """
+        verb, _, args = message.strip().partition(" ")
+        handler = self._handlers.get(verb.lower().lstrip(":"))
+        if handler is None:
+            LOGGER.warning("Unsupported SCPI message: %s", message)
+            return None
+        try:
+            return handler(args)
+        except ValueError:
+            LOGGER.warning("Invalid SCPI message: %s", message, exc_info=True)
+            return None
+
+    def power(self, port):
+        """Power level (dBm) measured in the given port"""
+        if port in self.input_power:
+            return self.input_power[port]
+        for port_in, port_out in self.connections.items():
+            if port_out == port:
+                return self.input_power[port_in] - INSERTION_LOSS
+        return DARK
+
+    def _idn(self, _):
+        return "Polatis,{},{},sim".format(self.product_code, self.serial)
+
+    def _stat(self, _):
+        pairs = sorted(self.connections.items())
+        return "(@{}),(@{})".format(
+            ",".join(str(port_in) for port_in, _ in pairs),
+            ",".join(str(port_out) for _, port_out in pairs),
+        )
+
+    def _add(self, args):
+        self._add_pairs(self._pairs(args))
+
+    def _sub(self, args):
+        for port_in, port_out in self._pairs(args):
+            if self.connections.get(port_in) == port_out:
+                del self.connections[port_in]
+
+    def _only(self, args):
+        pairs = self._pairs(args)
+        self.connections.clear()
+        self._add_pairs(pairs)
+
+    def _add_pairs(self, pairs):
+        for port_in, port_out in pairs:
+            # Both ports can be part of just a single cross-connect
+            self._release(port_in, port_out)
+            self.connections[port_in] = port_out
+
+    def _disconnect_all(self, _):
+        self.connections.clear()
+
+    def _power(self, args):
+        (ports,) = _parse_channel_lists(args)
+        return "({})".format(",".join("{:.2f}".format(self.power(p)) for p in ports))
+
+    def _network(self, _):
+        return 'IPADDR="{}" NETMASK="255.255.255.0" GATEWAY="0.0.0.0"'.format(self.ip)
+
+    def _pairs(self, args):
+        ports_in, ports_out = _parse_channel_lists(args)
+        if len(ports_in) != len(ports_out):
+            raise ValueError("Channel lists with different sizes")
+        pairs = [tuple(sorted(pair)) for pair in zip(ports_in, ports_out)]
+        for port_in, port_out in pairs:
+            if port_in not in self.inputs or port_out not in self.outputs:
+                msg = "Invalid cross-connect {}-{}".format(port_in, port_out)
+                raise ValueError(msg)
+        return pairs
+
+    def _release(self, port_in, port_out):
+        self.connections.pop(port_in, None)
+        for other_in, other_out in list(self.connections.items()):
+            if other_out == port_out:
+                del self.connections[other_in]
+
+
+class SimulatedOxc(object):
+    """TCP server exposing a :obj:`SimulatedDevice`
+
+    Arguments
+        device: simulated device, or ``None`` to create a new one with the
+            remaining keyword arguments.
+        host: address to listen on
+        port: TCP port to listen on (0 picks a free port)
+        latency: delay (seconds) added before processing each burst of
+            messages received from the client
+        jitter: maximum random delay (seconds) added to the latency
+    """
+
+    def __init__(
+        self, device=None, host="127.0.0.1", port=0, latency=0, jitter=0, **kwargs
+    ):
+        self.device = device or SimulatedDevice(ip=host, **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self._bind = (host, port)
+        self._server = None
+        self._clients = set()
+        self._random = random.Random(kwargs.get("seed"))
+
+    @property
+    def address(self):
+        """Tuple (host, port) where the simulator is listening"""
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, *self._bind)
+        LOGGER.debug(
+            "Simulated %s listening on %r", self.device.product_code, self.address
+        )
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for client in list(self._clients):
+                client.cancel()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients.add(task)
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                delay = self.latency + self._random.uniform(0, self.jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                responses = (self.device.handle(line.decode("utf-8")) for line in lines)
+                output = "".join(r + "\r\n" for r in responses if r is not None)
+                if output:
+                    writer.write(output.encode("utf-8"))
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled by ``stop``, the task finishes right away
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+
+class SimulatorThread(threading.Thread):
+    """Run several simulated devices in an event loop in a background thread
+
+    Arguments
+        count: number of simulated devices
+        kwargs: passed to :obj:`SimulatedOxc` (e.g. ``product_code``,
+            ``latency``, ``jitter``). When ``port`` is given, the devices
+            listen on consecutive ports starting from it.
+    """
+
+    def __init__(self, count=1, **kwargs):
+        super().__init__(daemon=True)
+        port = kwargs.pop("port", 0)
+        self.simulators = [
+            SimulatedOxc(port=port and port + i, **kwargs) for i in range(count)
+        ]
+        self._loop = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def addresses(self):
+        return [simulator.address for simulator in self.simulators]
+
+    @property
+    def devices(self):
+        return [simulator.device for simulator in self.simulators]
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        return self
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start_all())
+        except Exception as ex:
+            self._error = ex
+        self._ready.set()
+        if not self._error:
+            self._loop.run_forever()
+        self._loop.close()
+
+    def stop(self):
+        """Stop all the simulated devices"""
+        if self._loop and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._stop_all(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self.join()
+
+    async def _start_all(self):
+        await asyncio.gather(*(sim.start() for sim in self.simulators))
+
+    async def _stop_all(self):
+        await asyncio.gather(*(sim.stop() for sim in self.simulators))
+
+
+def _parse_channel_lists(message):
+    """Extract the lists of ports from a message with SCPI channel lists,
+    e.g. ``(@1,2,5:7),(@193:198)``
+    """
+    return [list(_decode_channels(group)) for group in _CHANNEL_LIST.findall(message)]
+
+
+def main(args=None):
+    """Run simulated Polatis OXCs until interrupted"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--count", type=int, default=1, help="number of devices")
+    parser.add_argument("--host", default="127.0.0.1", help="listen address")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=ScpiInterface.PORT,
+        help="first listen port, the devices use consecutive ports (0: random)",
+    )
+    parser.add_argument("--product-code", default=DEFAULT_PRODUCT_CODE)
+    parser.add_argument("--latency", type=float, default=0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0, help="seconds")
+    opts = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    sims = SimulatorThread(
+        count=opts.count,
+        host=opts.host,
+        port=opts.port,
+        product_code=opts.product_code,
+        latency=opts.latency,
+        jitter=opts.jitter,
+    ).start()
+    for host, port in sims.addresses:
+        LOGGER.info("Simulated %s listening on %s:%d", opts.product_code, host, port)
+    try:
+        sims.join()
+    except KeyboardInterrupt:
+        sims.stop()
+
+
+if __name__ == "__main__":
+    main()
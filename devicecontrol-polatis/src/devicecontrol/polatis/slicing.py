@@ -1,24 +1,41 @@
 #!/usr/bin/env python
 """
 Adds slicing capability on top of a regular Oxc object
+
+The translations made by :obj:`VirtualOxc` (virtual vs real ports) can be
+traced for debugging. Tracing costs nothing unless enabled, either by setting
+the level of this module's logger to ``DEBUG`` (side-by-side text rendering)
+or by adding a sink, which receives structured :obj:`TraceRecord` objects::
+
+    import logging
+    logging.getLogger("devicecontrol.polatis.slicing").setLevel(logging.DEBUG)
+
+    TRACE.add_sink(JsonLinesSink(open("slicing.jsonl", "a")))
+    TRACE.sample_rate = 0.01  # Trace just 1% of the operations
 """  # noqa
 import logging
-import sys
+import math
+import random
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
 from io import StringIO
 from itertools import filterfalse, tee, zip_longest
 from json import dumps
+from time import monotonic, sleep, time
 
+from . import _ConnectionCache, _sort_pairs
 from .interface import OxcInterface
+from .lib import memoized
 
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.DEBUG)
-_handler = logging.StreamHandler(stream=sys.stdout)
-_formatter = logging.Formatter(
-    "%(asctime)s [%(levelname)s] "
-    "%(name)s(%(lineno)s):\n%(message)s\n------------------------------"
-)
-_handler.setFormatter(_formatter)
-LOGGER.addHandler(_handler)
+
+TraceRecord = namedtuple("TraceRecord", "operation node real virtual timestamp")
+TraceRecord.__doc__ = """Translation made by a :obj:`VirtualOxc`: name of the
+``operation``, virtual device (``node``), data in terms of the ``real`` and
+``virtual`` ports (e.g. cross-connects or power levels) and ``timestamp``
+"""
 
 
 def json(x):
@@ -42,15 +59,111 @@ def join_text(text1, text2):
         buf.close()
 
 
+class SliceTrace(object):
+    """Deferred diagnostics of the translations made by :obj:`VirtualOxc`
+
+    Arguments
+        sinks: list of callables receiving each :obj:`TraceRecord`
+        sample_rate: fraction (between 0 and 1) of the operations traced
+        logger: logger where the records are rendered as text (only when
+            enabled for ``DEBUG``)
+
+    When there are no sinks and the logger is not enabled for ``DEBUG``,
+    tracing an operation is just a couple of attribute lookups: no record is
+    created and nothing is rendered.
+    """
+
+    def __init__(self, sinks=(), sample_rate=1.0, logger=LOGGER):
+        self.sample_rate = sample_rate
+        self.logger = logger
+        self._sinks = tuple(sinks)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self._sinks) or self.logger.isEnabledFor(logging.DEBUG)
+
+    def add_sink(self, sink):
+        with self._lock:
+            self._sinks += (sink,)
+
+    def remove_sink(self, sink):
+        with self._lock:
+            self._sinks = tuple(s for s in self._sinks if s is not sink)
+
+    def __call__(self, operation, node, real, virtual):
+        sinks = self._sinks
+        log = self.logger.isEnabledFor(logging.DEBUG)
+        if not (sinks or log):
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+
+        record = TraceRecord(operation, node, real, virtual, time())
+        for sink in sinks:
+            try:
+                sink(record)
+            except Exception:
+                self.logger.exception("Error in slicing trace sink %r", sink)
+        if log:
+            # Rendered by the logging handlers, only if the record is emitted
+            self.logger.debug("%s", _RenderedRecord(record))
+
+
+class JsonLinesSink(object):
+    """Trace sink writing each record as a line of JSON in a text stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = dumps(
+            {
+                "operation": record.operation,
+                "node": str(record.node),
+                "real": _json_map(record.real),
+                "virtual": _json_map(record.virtual),
+                "timestamp": record.timestamp,
+            }
+        )
+        with self._lock:
+            self.stream.write(line + "\n")
+
+
+class _RenderedRecord(object):
+    """Side-by-side text rendering of a :obj:`TraceRecord`, deferred until
+    it is converted to string
+    """
+
+    def __init__(self, record):
+        self.record = record
+
+    def __str__(self):
+        record = self.record
+        return "\n%s\n%s" % (
+            record.operation,
+            join_text(
+                "Real device:\n\n" + json(_json_map(record.real)),
+                "Virtual device:\n%s\n%s"
+                % (record.node, json(_json_map(record.virtual))),
+            ),
+        )
+
+
+def _json_map(data):
+    """JSON friendly version of the data in a trace record (dicts or
+    collections of pairs)
+    """
+    return {str(k): v for k, v in dict(data).items()}
+
+
+TRACE = SliceTrace()
+
+
 def log_real_vs_virtual(title, node, real, virtual):
-    LOGGER.debug(
-        "\n%s\n%s",
-        title,
-        join_text(
-            "Real device:\n\n" + json(dict(real)),
-            "Virtual device:\n%s\n%s" % (node, json(dict(virtual))),
-        ),
-    )
+    """Trace a translation with the module-wide :obj:`SliceTrace`"""
+    TRACE(title, node, real, virtual)
 
 
 def partition(predicate, iterable):
@@ -89,11 +202,20 @@ class PortMapping(object):
 
 
     Ports are always integers greater than 0 (starting from 1).
+
+    The translations from virtual to real ports use the lists directly, and
+    the reverse translations use precomputed dicts, so all of them are
+    constant-time.
     """
 
     def __init__(self, input_ports, output_ports):
         self._input_ports = input_ports
         self._output_ports = output_ports
+        # Reverse indexes (real => virtual), keeping the first occurrence
+        first_output = len(input_ports) + 1
+        self._virtual_inputs = _reverse_index(input_ports, 1)
+        self._virtual_outputs = _reverse_index(output_ports, first_output)
+        self._virtual_ports = {**self._virtual_outputs, **self._virtual_inputs}
 
     @property
     def input_number(self):
@@ -137,24 +259,28 @@ class PortMapping(object):
 
     def virtual_input(self, port):
         port = int(port)
-        validate_port_in("input", port, self._input_ports)
-        return self._input_ports.index(port) + 1
+        virtual = self._virtual_inputs.get(port)
+        if virtual is None:
+            validate_port_in("input", port, self._input_ports)
+        return virtual
 
     def virtual_output(self, port):
         port = int(port)
-        validate_port_in("output", port, self._output_ports)
-        return self._output_ports.index(port) + self.first_output
+        virtual = self._virtual_outputs.get(port)
+        if virtual is None:
+            validate_port_in("output", port, self._output_ports)
+        return virtual
 
     def virtual_port(self, port):
         port = int(port)
-        if port in self._input_ports:
-            return self.virtual_input(port)
+        if port in self._virtual_inputs:
+            return self._virtual_inputs[port]
         return self.virtual_output(port)
 
     def has_pair(self, port_in, port_out):
         port_in = int(port_in)
         port_out = int(port_out)
-        return port_in in self._input_ports and port_out in self._output_ports
+        return port_in in self._virtual_inputs and port_out in self._virtual_outputs
 
     def filter_connections(self, connections):
         own, others = partition(lambda c: self.has_pair(*c), dict(connections).items())
@@ -163,14 +289,20 @@ class PortMapping(object):
 
     def filter_real_ports(self, ports):
         plist = (int(p) for p in ports)
-        return (p for p in plist if p in self._input_ports or p in self._output_ports)
+        return (p for p in plist if p in self._virtual_ports)
 
     def virtual_connections(self, connections):
-        own, _ = self.filter_connections(connections)
-        return {
-            self.virtual_input(port_in): self.virtual_output(port_out)
-            for port_in, port_out in own.items()
-        }
+        """Translate the cross-connects of the real device that belong to
+        the slice, ignoring the remaining ones
+        """
+        inputs, outputs = self._virtual_inputs, self._virtual_outputs
+        virtual = {}
+        for port_in, port_out in dict(connections).items():
+            virtual_in = inputs.get(int(port_in))
+            virtual_out = outputs.get(int(port_out))
+            if virtual_in and virtual_out:
+                virtual[virtual_in] = virtual_out
+        return virtual
 
     def real_connections(self, connections):
         return {
@@ -178,6 +310,25 @@ class PortMapping(object):
             for port_in, port_out in dict(connections).items()
         }
 
+    def real_ports(self, ports):
+        """Translate a list of virtual ports"""
+        return [self.real_port(port) for port in ports]
+
+    def virtual_values(self, values):
+        """Translate a dict indexed by real ports (e.g. power levels),
+        ignoring the ports that do not belong to the slice
+        """
+        ports = self._virtual_ports
+        return {ports[port]: value for port, value in values.items() if port in ports}
+
+
+def _reverse_index(ports, first):
+    """Dict relating each port in the list to its position (from ``first``)"""
+    index = {}
+    for i, port in enumerate(ports, first):
+        index.setdefault(port, i)
+    return index
+
 
 class VirtualOxc(OxcInterface):
     """Take control of some ports inside the OXC, simulating a smaller device.
@@ -189,24 +340,49 @@ class VirtualOxc(OxcInterface):
             controlled by the virtual device.
         output_ports: list of output port numbers of the real device to be
             controlled by the virtual device
+        trace: (Optional) :obj:`SliceTrace` receiving the translations made,
+            the module-wide ``TRACE`` by default
 
 
     Ports are always integers greater than 0 (starting from 1).
+
+    When the underlay is itself a :obj:`VirtualOxc`, the ports are validated
+    against it (they must be inputs/outputs of the parent slice), and then
+    translated to the ports of the device below it. This way, the new slice
+    is mapped directly onto the physical device, and operating a slice of a
+    slice costs the same as operating a first-level slice.
     """
 
-    def __init__(self, underlay, input_ports, output_ports):
+    def __init__(self, underlay, input_ports, output_ports, trace=None):
         self._input_ports = [int(p) for p in input_ports]
         self._output_ports = [int(p) for p in output_ports]
-        self.mapping = PortMapping(self._input_ports, self._output_ports)
+        self.parent = None
+        real_inputs, real_outputs = self._input_ports, self._output_ports
+        if isinstance(underlay, VirtualOxc):
+            # Flatten: map the ports straight onto the parent's underlay
+            real_inputs = [underlay.mapping.real_input(p) for p in real_inputs]
+            real_outputs = [underlay.mapping.real_output(p) for p in real_outputs]
+            self.parent, underlay = underlay, underlay._underlay
+        self.mapping = PortMapping(real_inputs, real_outputs)
+        self._real_ports = real_inputs + real_outputs
         self._underlay = underlay
+        self._trace = trace or TRACE
+        self._real_power_ports = None
 
     def __str__(self):
-        return "<{}://{}:{}/{}|{}>".format(
-            self.__class__.__name__,
-            *self._underlay.address,
+        return "<{}://{}:{}/{}>".format(
+            self.__class__.__name__, *self._underlay.address, self._path()
+        )
+
+    def _path(self):
+        """Ports taken by each level of slicing, e.g. ``11,12|193/1|2``"""
+        ports = "{}|{}".format(
             ",".join(str(p) for p in self._input_ports),
             ",".join(str(p) for p in self._output_ports),
         )
+        if self.parent is None:
+            return ports
+        return self.parent._path() + "/" + ports
 
     @property
     def idn(self):
@@ -229,7 +405,7 @@ class VirtualOxc(OxcInterface):
             return
 
         real = self.mapping.real_connections(connection_map)
-        log_real_vs_virtual("connect", str(self), real, connection_map)
+        self._trace("connect", self, real, connection_map)
         self._underlay.connect(real)
 
     def disconnect(self, connection_map):
@@ -237,7 +413,7 @@ class VirtualOxc(OxcInterface):
             return
 
         real = self.mapping.real_connections(connection_map)
-        log_real_vs_virtual("disconnect", str(self), real, connection_map)
+        self._trace("disconnect", self, real, connection_map)
         self._underlay.disconnect(real)
 
     def disconnect_all(self):
@@ -246,8 +422,8 @@ class VirtualOxc(OxcInterface):
     @property
     def connections(self):
         real = self._underlay.connections
-        virtual = self.mapping.virtual_connections(self._underlay.connections)
-        log_real_vs_virtual("connections", str(self), real, virtual)
+        virtual = self.mapping.virtual_connections(real)
+        self._trace("connections", self, real, virtual)
         return virtual
 
     @connections.setter
@@ -263,16 +439,463 @@ class VirtualOxc(OxcInterface):
         self.connect(add)
 
     def get_power(self, port_list):
-        ports = (self.mapping.real_port(p) for p in port_list)
-        real = self._underlay.get_power(ports)
-        virtual = {self.mapping.virtual_port(k): v for k, v in real.items()}
-        log_real_vs_virtual("get_power", str(self), real, virtual)
+        real = self._underlay.get_power(self.mapping.real_ports(port_list))
+        virtual = self.mapping.virtual_values(real)
+        self._trace("get_power", self, real, virtual)
         return virtual
 
+    @property
+    def power_ports(self):
+        """List of (virtual) ports whose power level can be read"""
+        real = self._power_ports_in_underlay()
+        if real is None:
+            return sorted(self.power)
+        return sorted(self.mapping.virtual_values(dict.fromkeys(real)))
+
     @property
     def power(self):
-        real = self._underlay.power
-        real_ports = self.mapping.filter_real_ports(real.keys())
-        virtual = {self.mapping.virtual_port(k): real[k] for k in real_ports}
-        log_real_vs_virtual("power", str(self), real, virtual)
+        # Just the ports of the slice are read, instead of the whole device
+        ports = self._power_ports_in_underlay()
+        if ports is None:
+            real = self._underlay.power
+        else:
+            real = self._underlay.get_power(ports)
+        virtual = self.mapping.virtual_values(real)
+        self._trace("power", self, real, virtual)
+        return virtual
+
+    def _power_ports_in_underlay(self):
+        """Real ports of the slice with photodetectors (``None`` if the
+        underlay does not tell which ports have them)
+        """
+        if self._real_power_ports is None:
+            available = getattr(self._underlay, "power_ports", None)
+            if available is None:
+                return None
+            available = set(available)
+            self._real_power_ports = [
+                port
+                for port in self._real_ports
+                if port in available
+            ]
+        return self._real_power_ports
+
+
+class SliceManager(object):
+    """Owns a real OXC and all its slices
+
+    Arguments
+        underlay (OxcInterface): real device (e.g. :obj:`~.Oxc`) shared by
+            the slices
+        snapshot_ttl: number of seconds a snapshot of the cross-connects of
+            the real device is shared by the slices before being retrieved
+            again
+        power_ttl: number of seconds the power levels read for a slice are
+            shared with the other slices (0 disables the sharing)
+        coalesce_window: (Optional) when given, the ``connect``/``disconnect``
+            calls made by different slices within this number of seconds are
+            merged and sent together (see :obj:`WriteCoalescer`)
+
+    All the slices read the cross-connects from a single snapshot, so reading
+    the connections of N slices costs a single ``conn:stat?``. The snapshot is
+    updated by the operations made through the slices, and retrieved again
+    after ``snapshot_ttl`` or when ``refresh`` is called::
+
+        manager = SliceManager(Oxc(IP_ADDR))
+        tenant1 = manager.add_slice("tenant1", range(1, 11), range(193, 203))
+        tenant2 = manager.add_slice("tenant2", range(11, 21), range(203, 213))
+        manager.connections()  # Single query for all the slices
+        # => {'tenant1': {1: 11}, 'tenant2': {}}
+
+    Similarly, when a slice reads its power levels, the ports of all the
+    slices are read at once (in a single burst), and the levels are shared
+    for ``power_ttl`` seconds, so many slices polling together cost a single
+    sweep.
+
+    Each real port can belong to just a single slice, which is checked with
+    an index relating each port to its owner.
+    """
+
+    SNAPSHOT_TTL = 1
+    POWER_TTL = 0.5
+
+    def __init__(
+        self,
+        underlay,
+        snapshot_ttl=SNAPSHOT_TTL,
+        power_ttl=POWER_TTL,
+        coalesce_window=None,
+    ):
+        self.underlay = underlay
+        self.slices = {}
+        self._owners = {}  # real port => name of the slice
+        self._shared = _SharedUnderlay(
+            underlay, snapshot_ttl, power_ttl, self.slices, coalesce_window
+        )
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        return self.slices[name]
+
+    def __iter__(self):
+        return iter(self.slices)
+
+    def __len__(self):
+        return len(self.slices)
+
+    def add_slice(self, name, input_ports, output_ports):
+        """Create a :obj:`VirtualOxc` controlling the given ports of the real
+        device, which cannot belong to any other slice
+        """
+        input_ports = [int(p) for p in input_ports]
+        output_ports = [int(p) for p in output_ports]
+        ports = input_ports + output_ports
+        with self._lock:
+            if name in self.slices:
+                raise ValueError("Slice %r already exists" % (name,), "slice-name")
+            if len(set(ports)) != len(ports):
+                raise ValueError(
+                    "Slice %r has repeated ports" % (name,), "overlapping-ports"
+                )
+            taken = sorted(p for p in ports if p in self._owners)
+            if taken:
+                owners = sorted({str(self._owners[p]) for p in taken})
+                raise ValueError(
+                    "Ports %r already belong to slices %s" % (taken, ", ".join(owners)),
+                    "overlapping-ports",
+                )
+            virtual = VirtualOxc(self._shared, input_ports, output_ports)
+            self.slices[name] = virtual
+            self._owners.update(dict.fromkeys(ports, name))
         return virtual
+
+    def remove_slice(self, name):
+        """Release the ports of a slice (its cross-connects are kept)"""
+        with self._lock:
+            self.slices.pop(name)
+            self._owners = {p: n for p, n in self._owners.items() if n != name}
+
+    def owner(self, port):
+        """Name of the slice owning the given real port (``None`` if free)"""
+        return self._owners.get(int(port))
+
+    def refresh(self):
+        """Retrieve a new snapshot of the cross-connects of the real device"""
+        return self._shared.refresh()
+
+    def connections(self):
+        """Dict relating each slice name to its cross-connects, translated
+        from a single fresh snapshot
+        """
+        snapshot = self.refresh()
+        return {
+            name: virtual.mapping.virtual_connections(snapshot)
+            for name, virtual in self.slices.items()
+        }
+
+    @property
+    def snapshot_stats(self):
+        """Dict with the number of ``hits`` and ``misses`` of the snapshot"""
+        return self._shared.stats
+
+    @property
+    def write_stats(self):
+        """Dict with the number of write ``calls`` made by the slices,
+        ``bursts`` sent to the real device and ``splits`` of failed merged
+        bursts (``None`` without coalescing, see :obj:`WriteCoalescer`)
+        """
+        return self._shared.coalescer_stats
+
+
+class _SharedUnderlay(object):
+    """View of the real OXC used by the slices of a :obj:`SliceManager`,
+    serving the cross-connects and power levels from shared snapshots
+    """
+
+    def __init__(self, oxc, ttl, power_ttl, slices, coalesce_window=None):
+        self._oxc = oxc
+        self._snapshot = _ConnectionCache(ttl)
+        self._coalescer = None
+        if coalesce_window is not None:
+            # Holding the snapshot lock while writing, like ``_write_through``
+            self._coalescer = WriteCoalescer(
+                oxc, coalesce_window, lock=self._snapshot.lock
+            )
+        self._slices = slices
+        self._power_ttl = power_ttl
+        self._power = {}
+        self._power_timestamp = -math.inf
+        self._power_lock = threading.Lock()
+        self._power_hits = 0
+        self._power_misses = 0
+
+    @property
+    def address(self):
+        return self._oxc.address
+
+    @property
+    def idn(self):
+        return self._oxc.idn
+
+    @property
+    def stats(self):
+        return {
+            "hits": self._snapshot.hits,
+            "misses": self._snapshot.misses,
+            "power_hits": self._power_hits,
+            "power_misses": self._power_misses,
+        }
+
+    @property
+    @memoized
+    def power_ports(self):
+        return self._oxc.power_ports
+
+    @property
+    def connections(self):
+        # Slices asking at the same time wait for a single retrieval
+        with self._snapshot.lock:
+            connections = self._snapshot.get()
+            if connections is None:
+                connections = self.refresh()
+            return connections
+
+    def refresh(self):
+        with self._snapshot.lock:
+            connections = dict(self._oxc.connections)
+            self._snapshot.store(connections)
+            return connections
+
+    @property
+    def coalescer_stats(self):
+        return self._coalescer.stats if self._coalescer else None
+
+    def connect(self, connection_map):
+        if self._coalescer:
+            return self._coalesced("add", connection_map)
+        with self._write_through("add", connection_map):
+            self._oxc.connect(connection_map)
+
+    def disconnect(self, connection_map):
+        if self._coalescer:
+            return self._coalesced("sub", connection_map)
+        with self._write_through("sub", connection_map):
+            self._oxc.disconnect(connection_map)
+
+    def _coalesced(self, operation, connection_map):
+        # The snapshot lock cannot be held while waiting for the other
+        # slices, so the snapshot is updated afterwards (idempotent)
+        try:
+            self._coalescer.submit(operation, connection_map).result()
+        except BaseException:
+            self._snapshot.invalidate()
+            raise
+        self._snapshot.apply(operation, connection_map)
+
+    def get_power(self, port_list):
+        port_list = list(port_list)
+        if not self._power_ttl:
+            return self._oxc.get_power(port_list)
+        # Slices asking at the same time wait for a single sweep
+        with self._power_lock:
+            levels = self._power
+            fresh = monotonic() - self._power_timestamp <= self._power_ttl
+            if fresh and all(port in levels for port in port_list):
+                self._power_hits += 1
+            else:
+                self._power_misses += 1
+                levels = self._sweep(port_list)
+            return {port: levels[port] for port in port_list if port in levels}
+
+    @property
+    def power(self):
+        return self._oxc.power
+
+    def _sweep(self, port_list):
+        """Read the power levels of all the slices (plus the given ports)"""
+        ports = set(port_list)
+        for virtual in list(self._slices.values()):
+            real = virtual._power_ports_in_underlay()
+            if real is None:
+                # Unknown photodetectors: the outputs always have them
+                real = virtual.mapping.real_ports(virtual.ports[1])
+            ports.update(real)
+        self._power = dict(self._oxc.get_power(sorted(ports)))
+        self._power_timestamp = monotonic()
+        return self._power
+
+    @contextmanager
+    def _write_through(self, operation, connection_map):
+        with self._snapshot.lock:
+            try:
+                yield
+            except BaseException:
+                self._snapshot.invalidate()
+                raise
+            self._snapshot.apply(operation, connection_map)
+
+
+class WriteCoalescer(object):
+    """Merge ``connect``/``disconnect`` calls made at the same time (e.g. by
+    different slices) into a single ``conn:sub`` and a single ``conn:add``,
+    sent in one burst
+
+    Arguments
+        underlay (OxcInterface): device receiving the merged operations
+        window: number of seconds the first call waits for others to join
+        lock: (Optional) lock held while the merged operations are sent
+
+    The first call of each window sends the merged operations on behalf of
+    all the calls that joined it, and each call completes with the outcome
+    of the burst. If the merged burst fails, the operations are sent again
+    one by one, in the order they were submitted, so each call gets its own
+    outcome (e.g. a call with invalid ports does not make the others fail).
+    ``add`` and ``sub`` are idempotent, so resending operations that were
+    already applied by the failed burst leaves the device unchanged.
+
+    Operations touching ports already present in the pending batch are not
+    merged (their order could change the outcome), they start a new batch.
+    Batches are always sent in the order they were created.
+    """
+
+    WINDOW = 0.005
+
+    def __init__(self, underlay, window=WINDOW, lock=None):
+        self.underlay = underlay
+        self.window = window
+        self._write_lock = lock
+        self._lock = threading.Lock()
+        self._pending = None  # Batch accepting operations
+        self._last = None  # Last batch created, not sent yet
+        self._calls = 0
+        self._bursts = 0
+        self._splits = 0
+
+    @property
+    def stats(self):
+        """Dict with the number of ``calls`` received, ``bursts`` sent and
+        failed merged bursts resent one operation at a time (``splits``)
+        """
+        return {"calls": self._calls, "bursts": self._bursts, "splits": self._splits}
+
+    def connect(self, connection_map):
+        self.submit("add", connection_map).result()
+
+    def disconnect(self, connection_map):
+        self.submit("sub", connection_map).result()
+
+    def submit(self, operation, connection_map):
+        """Queue an operation (``add`` or ``sub``) returning a
+        :obj:`~concurrent.futures.Future`
+
+        When the operation starts a new batch, this call blocks until the
+        batch is sent.
+        """
+        pairs = _sort_pairs(connection_map)
+        future = Future()
+        if not pairs:
+            future.set_result(None)
+            return future
+
+        ports = set(pairs).union(pairs.values())
+        with self._lock:
+            self._calls += 1
+            batch = self._pending
+            lead = batch is None or batch.sealed or not batch.ports.isdisjoint(ports)
+            if lead:
+                if batch is not None:
+                    batch.sealed = True
+                batch = self._pending = self._last = _PendingWrite(self._last)
+            (batch.removed if operation == "sub" else batch.added).update(pairs)
+            batch.ports.update(ports)
+            batch.calls.append((operation, pairs, future))
+
+        if lead:
+            self._lead(batch)
+        return future
+
+    def _lead(self, batch):
+        sleep(self.window)
+        with self._lock:
+            batch.sealed = True
+            if self._pending is batch:
+                self._pending = None
+        if batch.previous is not None:
+            batch.previous.sent.wait()
+            batch.previous = None
+
+        try:
+            try:
+                self._send(batch.removed, batch.added)
+            except Exception:
+                if len(batch.calls) == 1:
+                    raise
+                self._split(batch)
+            else:
+                for _, _, future in batch.calls:
+                    future.set_result(None)
+        except BaseException as ex:
+            # Every pending write gets an outcome, even when the split is
+            # interrupted (e.g. KeyboardInterrupt), so no caller waits forever
+            for _, _, future in batch.calls:
+                if not future.done():
+                    future.set_exception(ex)
+        finally:
+            with self._lock:
+                if self._last is batch:
+                    self._last = None
+            batch.sent.set()
+
+    def _split(self, batch):
+        """Send the operations of a failed batch one by one"""
+        with self._lock:
+            self._splits += 1
+        for operation, pairs, future in batch.calls:
+            _resolve(future, self._send, *_operands(operation, pairs))
+
+    def _send(self, removed, added):
+        if self._write_lock is None:
+            return self._burst(removed, added)
+        with self._write_lock:
+            return self._burst(removed, added)
+
+    def _burst(self, removed, added):
+        with self._lock:
+            self._bursts += 1
+        if hasattr(self.underlay, "batch"):
+            with self.underlay.batch() as batch:
+                batch.disconnect(removed)
+                batch.connect(added)
+            return
+        if removed:
+            self.underlay.disconnect(removed)
+        if added:
+            self.underlay.connect(added)
+
+
+class _PendingWrite(object):
+    """Operations merged by :obj:`WriteCoalescer` in a single batch"""
+
+    def __init__(self, previous):
+        self.previous = previous  # Batch that must be sent before this one
+        self.removed = {}
+        self.added = {}
+        self.ports = set()
+        self.calls = []  # (operation, pairs, future) in submission order
+        self.sealed = False  # No more operations can be merged
+        self.sent = threading.Event()
+
+
+def _operands(operation, pairs):
+    """Arguments ``(removed, added)`` of ``WriteCoalescer._send`` for a
+    single operation
+    """
+    return (pairs, {}) if operation == "sub" else ({}, pairs)
+
+
+def _resolve(future, function, *args):
+    """Resolve the future with the outcome of ``function(*args)``"""
+    try:
+        future.set_result(function(*args))
+    except Exception as ex:
+        future.set_exception(ex)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Reconfiguration of an OXC with verification and rollback.
+
+Operations queued in a :obj:`Transaction` are reduced to the net change
+(a single ``conn:sub`` and a single ``conn:add``) and sent in one burst with a
+``conn:stat?`` that verifies the outcome. If the device does not end up with
+the expected cross-connects, the previous configuration is restored::
+
+    with Transaction(oxc) as transaction:
+        transaction.disconnect({1: 193})
+        transaction.connect({1: 194, 2: 193})
+
+    transaction.report.timings
+    # => {'snapshot': 0.011, 'apply': 0.093, 'verify': 0.0001, 'rollback': 0}
+
+:obj:`TransactionFailed` is raised (after the rollback) when the
+verification fails.
+"""
+import math
+from collections import namedtuple
+from time import monotonic
+
+from . import _ConnectionCache, _sort_pairs
+from .scpi import ScpiError
+
+TransactionReport = namedtuple(
+    "TransactionReport", "before after added removed rolled_back timings"
+)
+TransactionReport.__doc__ = """Outcome of a :obj:`Transaction`: cross-connects
+in the device ``before`` and ``after`` it, cross-connects ``added`` and
+``removed``, whether the previous configuration had to be restored
+(``rolled_back``) and dict with the number of seconds spent in each phase
+(``timings``: ``snapshot``, ``apply``, ``verify`` and ``rollback``)
+"""
+
+
+class TransactionFailed(ScpiError):
+    """Cross-connects do not match the expected after a transaction"""
+
+    def __init__(self, report, expected):
+        super().__init__()
+        self.report = report
+        self.expected = expected
+
+
+class Transaction(object):
+    """Group of ``connect``/``disconnect`` operations applied to an OXC as a
+    unit
+
+    Arguments
+        oxc: :obj:`~devicecontrol.polatis.Oxc` being reconfigured
+
+    The operations are sent when the ``with`` block finishes without errors
+    (or when ``commit`` is called), in 3 phases:
+
+    1. snapshot: the active cross-connects are read from the device
+    2. apply: the net change is sent in a single burst, followed by the
+       retrieval of the resulting cross-connects
+    3. verify: the result is compared with the expected cross-connects
+
+    When the result does not match, or an error happens while applying the
+    change, the snapshot is restored with ``conn:only``.
+    """
+
+    def __init__(self, oxc):
+        self.oxc = oxc
+        self.report = None
+        self._operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._operations = []
+
+    def __len__(self):
+        return len(self._operations)
+
+    def connect(self, connection_map):
+        """Queue the addition of the given cross-connects"""
+        self._operations.append(("add", connection_map))
+
+    def disconnect(self, connection_map):
+        """Queue the removal of the given cross-connects"""
+        self._operations.append(("sub", connection_map))
+
+    def commit(self):
+        """Apply the queued operations, returning a :obj:`TransactionReport`"""
+        operations, self._operations = self._operations, []
+        timings = dict.fromkeys(("snapshot", "apply", "verify", "rollback"), 0)
+
+        start = monotonic()
+        before = dict(self.oxc.refresh())
+        expected = _expected_connections(before, operations)
+        removed = {i: o for i, o in before.items() if expected.get(i) != o}
+        added = {i: o for i, o in expected.items() if before.get(i) != o}
+        timings["snapshot"] = monotonic() - start
+
+        start = monotonic()
+        try:
+            after = self._apply(added, removed)
+        except BaseException:
+            timings["apply"] = monotonic() - start
+            try:
+                self._rollback(before, timings)
+            except Exception:
+                self.oxc._logger.exception(
+                    "Rollback of transaction in OXC %s:%s failed", *self.oxc.address
+                )
+            raise
+        timings["apply"] = monotonic() - start
+
+        start = monotonic()
+        matches = after == expected
+        timings["verify"] = monotonic() - start
+
+        if matches:
+            self.report = TransactionReport(
+                before, after, added, removed, False, timings
+            )
+            return self.report
+
+        self.oxc._logger.warning(
+            "Transaction in OXC %s:%s rolling back, expected %r, found %r",
+            *self.oxc.address,
+            expected,
+            after,
+        )
+        after = self._rollback(before, timings)
+        self.report = TransactionReport(before, after, added, removed, True, timings)
+        raise TransactionFailed(self.report, expected)
+
+    def _apply(self, added, removed):
+        with self.oxc.batch() as batch:
+            batch.disconnect(removed)
+            batch.connect(added)
+            after = batch.connections()
+        return dict(after.result())
+
+    def _rollback(self, before, timings):
+        start = monotonic()
+        try:
+            with self.oxc.batch() as batch:
+                batch.set_connections(before)
+                after = batch.connections()
+            return dict(after.result())
+        finally:
+            timings["rollback"] = monotonic() - start
+
+
+def _expected_connections(connections, operations):
+    """Cross-connects resulting from applying the operations in order"""
+    mirror = _ConnectionCache(math.inf)
+    mirror.store(connections)
+    for operation, connection_map in operations:
+        mirror.apply(operation, connection_map)
+    return _sort_pairs(mirror.get())
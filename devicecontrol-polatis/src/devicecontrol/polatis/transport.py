@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Lean transport for SCPI sockets.
+
+:obj:`BufferedSession` implements the small subset of
+:obj:`pexpect.fdpexpect.fdspawn` used by :obj:`~.scpi.ScpiInterface`
+(``sendline``, ``expect_exact``, ``before`` and ``close``), but reads
+straight into a reusable :obj:`bytearray`, looks for the markers with
+``bytearray.find`` and exposes the data preceding the marker as a
+:obj:`memoryview`, without intermediate copies or decoding.
+"""
+from socket import timeout as SocketTimeout
+from time import monotonic
+
+
+class BufferedSession(object):
+    """Buffered line reader on top of a connected socket
+
+    Arguments
+    ---------
+    sock : socket.socket
+        Connected socket
+    timeout : float
+        Maximum number of seconds waiting for a marker in ``expect_exact``
+    """
+
+    BUFFER_SIZE = 64 * 1024  # Initial size, the buffer grows if necessary
+
+    def __init__(self, sock, timeout):
+        self.timeout = timeout
+        self._socket = sock
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._start = 0  # Beginning of the data not consumed yet
+        self._end = 0  # End of the data received
+        self._before = None
+
+    @property
+    def before(self):
+        """View of the data received before the last marker found.
+
+        It is valid just until the next call to ``expect_exact``.
+        """
+        return self._before
+
+    def sendline(self, message):
+        self._socket.sendall((message + "\n").encode("utf-8"))
+
+    def expect_exact(self, marker):
+        """Consume the received data until (and including) the given marker.
+
+        Raises :obj:`socket.timeout` if the marker is not found in time (the
+        data is kept in the buffer), or :obj:`EOFError` if the device closes
+        the connection.
+        """
+        if isinstance(marker, str):
+            marker = marker.encode("utf-8")
+        self._release()
+
+        deadline = monotonic() + self.timeout
+        scanned = 0  # Relative to start, so it survives the buffer compaction
+        while True:
+            index = self._buffer.find(marker, self._start + scanned, self._end)
+            if index >= 0:
+                self._before = memoryview(self._buffer)[self._start : index]  # noqa
+                self._start = index + len(marker)
+                return 0
+            scanned = max(0, self._end - self._start - len(marker) + 1)
+            self._receive(deadline)
+
+    def close(self):
+        self._release()
+        self._socket.close()
+
+    def _receive(self, deadline):
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            raise SocketTimeout("timed out")
+        if self._end == len(self._buffer):
+            self._make_room()
+
+        self._socket.settimeout(remaining)
+        with memoryview(self._buffer) as view:
+            received = self._socket.recv_into(view[self._end :])  # noqa
+        if not received:
+            raise EOFError("Connection closed by the device")
+        self._end += received
+
+    def _make_room(self):
+        pending = self._end - self._start
+        if self._start:
+            # Same-size slice assignment: the buffer is not resized
+            self._buffer[:pending] = self._buffer[self._start : self._end]  # noqa
+        else:
+            self._buffer.extend(bytes(len(self._buffer)))
+        self._start, self._end = 0, pending
+
+    def _release(self):
+        if self._before is not None:
+            self._before.release()
+            self._before = None
+        if self._start == self._end:
+            # Everything was consumed, so the buffer can be reused from start
+            self._start = self._end = 0
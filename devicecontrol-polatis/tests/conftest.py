@@ -1,11 +1,50 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-    Dummy conftest.py for polatis.
+    Shared fixtures for the polatis tests.
 
-    If you don't know what this is for, just leave it empty.
+    The tests talk to simulated devices (``devicecontrol.polatis.sim``)
+    running in a background thread, so no real switch is required.
     Read more about conftest.py under:
     https://pytest.org/latest/plugins.html
 """
+import pytest
 
-# import pytest
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.metadata import METADATA_CACHE
+from devicecontrol.polatis.scpi import TRANSPORTS
+from devicecontrol.polatis.sim import SimulatorThread
+
+
+@pytest.fixture(autouse=True)
+def metadata_cache():
+    """Simulators reuse addresses, the metadata must not leak between tests"""
+    yield METADATA_CACHE
+    METADATA_CACHE.invalidate()
+
+
+@pytest.fixture
+def simulators():
+    """Two simulated 192x192 devices"""
+    with SimulatorThread(count=2, seed=1) as simulators:
+        yield simulators
+
+
+@pytest.fixture
+def device(simulators):
+    """State of the first simulated device"""
+    return simulators.devices[0]
+
+
+@pytest.fixture(params=sorted(TRANSPORTS))
+def transport(request):
+    """Each of the SCPI transports, so they are compared on the same tests"""
+    return request.param
+
+
+@pytest.fixture
+def oxc(simulators, transport):
+    """``Oxc`` connected to the first simulated device"""
+    oxc = Oxc(*simulators.addresses[0], transport=transport)
+    yield oxc
+    oxc.close()
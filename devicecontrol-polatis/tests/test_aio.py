@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from devicecontrol.polatis.aio import AsyncOxc
+from devicecontrol.polatis.scpi import ScpiDisconnected
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def _serve_once(response, close=False):
+    """Fake device answering ``*opc?`` and then ``response`` to anything else"""
+
+    async def _handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip() == b"*opc?":
+                writer.write(b"1\r\n")
+            else:
+                writer.write(response)
+                if close:
+                    writer.close()
+                    return
+            await writer.drain()
+
+    return await asyncio.start_server(_handle, "127.0.0.1", 0)
+
+
+def test_async_oxc_against_simulator(simulators, device):
+    async def scenario():
+        async with AsyncOxc(*simulators.addresses[0]) as oxc:
+            assert await oxc.number_of_ports == (192, 192)
+            await oxc.connect({1: 193, 2: 194})
+            await oxc.disconnect({2: 194})
+            connections = await oxc.connections
+            power = await oxc.get_power([193, 194])
+        return connections, power
+
+    connections, power = run(scenario())
+    assert connections == {1: 193}
+    assert device.connections == {1: 193}
+    assert set(power) == {193, 194}
+
+
+@pytest.mark.parametrize(
+    "response, close",
+    [
+        (b"x" * 256, False),  # Limit overrun
+        (b"partial", True),  # Incomplete read
+    ],
+    ids=["limit-overrun", "incomplete-read"],
+)
+def test_stream_errors_are_translated(response, close):
+    async def scenario():
+        server = await _serve_once(response, close)
+        oxc = AsyncOxc(*server.sockets[0].getsockname()[:2], timeout=0.2)
+        oxc.LIMIT = 64
+        try:
+            with pytest.raises(ScpiDisconnected):
+                await oxc.query("*idn?")
+        finally:
+            await oxc.close()
+            server.close()
+
+    run(scenario())
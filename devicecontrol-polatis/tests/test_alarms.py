@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import queue
+
+import pytest
+
+from devicecontrol.polatis.alarms import AlarmEvent, PowerAlarms
+from devicecontrol.polatis.slicing import VirtualOxc
+
+
+def _transitions(events):
+    return [(event.port, event.kind, event.raised) for event in events]
+
+
+@pytest.fixture
+def alarms():
+    alarms = PowerAlarms(oxc=None)
+    alarms.add([193, 194], low=-20, high=-5, hysteresis=1)
+    return alarms
+
+
+def test_alarms_are_raised_and_cleared_with_hysteresis(alarms):
+    assert alarms.evaluate([-10, -10]) == []
+    assert _transitions(alarms.evaluate([-21, -10])) == [(193, "low", True)]
+    assert alarms.active() == {193: "low"}
+    # Oscillating around the threshold does not produce events
+    assert alarms.evaluate([-19.5, -10]) == []
+    assert alarms.evaluate([-20.5, -10]) == []
+    assert alarms.evaluate([-19.0, -10]) == []  # Exactly at the hysteresis
+    assert _transitions(alarms.evaluate([-18.9, -10])) == [(193, "low", False)]
+    assert alarms.active() == {}
+
+
+def test_high_alarms_and_direct_transitions(alarms):
+    events = alarms.evaluate([-10, -4], timestamp=100)
+    assert events == [AlarmEvent(194, "high", True, -4, -5, 100)]
+    assert alarms.evaluate([-10, -5.5]) == []
+    # From high straight to low: one event clears, another raises
+    assert _transitions(alarms.evaluate([-10, -30])) == [
+        (194, "high", False),
+        (194, "low", True),
+    ]
+
+
+def test_missing_readings_keep_the_state(alarms):
+    nan = float("nan")
+    alarms.evaluate([-21, -10])
+    assert alarms.evaluate([nan, nan]) == []
+    assert alarms.active() == {193: "low"}
+
+
+def test_thresholds_can_be_replaced_and_removed(alarms):
+    alarms.add(193, low=None, high=0)
+    assert alarms.evaluate([-50, -10]) == []
+    alarms.remove([193])
+    assert alarms.ports == [194]
+    assert _transitions(alarms.evaluate([-30])) == [(194, "low", True)]
+
+
+def test_events_are_delivered_from_the_device(oxc, device):
+    events, received = queue.Queue(), []
+    device.input_power[1] = -3.0
+    alarms = PowerAlarms(oxc, interval=0.01, callbacks=[received.append], queue=events)
+    alarms.add(193, low=-10)
+    with alarms:
+        assert events.get(timeout=2).raised  # 193 is dark
+        oxc.connect({1: 193})
+        cleared = events.get(timeout=2)
+    assert (cleared.port, cleared.raised) == (193, False)
+    assert cleared.level == pytest.approx(-4.5)
+    assert received[:2] == [received[0], cleared]
+
+
+def test_callback_errors_do_not_stop_the_delivery(alarms):
+    received = []
+    alarms.callbacks = [lambda event: 1 / 0, received.append]
+    alarms.evaluate([-21, -10])
+    assert len(received) == 1
+
+
+def test_alarms_on_a_virtual_device(oxc, device):
+    device.input_power[1] = -3.0
+    device.connections.update({1: 193})
+    virtual = VirtualOxc(oxc, [1, 2], [193, 194])
+    alarms = PowerAlarms(virtual)
+    alarms.add([3, 4], low=-10)
+    assert _transitions(alarms.check()) == [(4, "low", True)]
+    assert alarms.active() == {4: "low"}
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+
+from devicecontrol.polatis import Oxc
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def observed(simulators, transport, events):
+    oxc = Oxc(*simulators.addresses[0], transport=transport, observers=[events.append])
+    oxc.sync()
+    events.clear()
+    yield oxc
+    oxc.close()
+
+
+def test_scpi_batch_sends_a_single_burst(observed, events):
+    with observed.batch() as batch:
+        idn = batch.query("*idn?", lambda msg: msg.split(","))
+        command = batch.command("oxc:swit:conn:add (@1),(@193)")
+        stat = batch.query("oxc:swit:conn:stat?")
+        assert len(batch) == 3
+        assert not idn.done()
+
+    assert idn.result()[1] == "N-VST-192x192-LU1-DMHNV-801"
+    assert command.result() is None
+    assert stat.result()
+    assert [event.verb for event in events] == ["burst"]
+
+
+def test_scpi_batch_is_discarded_on_errors(observed, device, events):
+    with pytest.raises(RuntimeError):
+        with observed.batch() as batch:
+            future = batch.command("oxc:swit:conn:add (@1),(@193)")
+            raise RuntimeError
+    assert future.cancelled()
+    assert not events
+    assert device.connections == {}
+
+
+def test_scpi_batch_parser_errors_are_reported_per_future(observed):
+    with observed.batch() as batch:
+        bad = batch.query("*idn?", int)
+        good = batch.query("*idn?")
+    with pytest.raises(ValueError):
+        bad.result()
+    assert good.result().startswith("Polatis")
+
+
+def test_oxc_batch(observed, device, events):
+    device.connections.update({3: 195})
+    with observed.batch() as batch:
+        batch.disconnect({3: 195})
+        batch.connect({1: 193, 2: 194})
+        connections = batch.connections()
+        power = batch.get_power(range(193, 193 + 120))  # Several chunks
+
+    assert connections.result() == {1: 193, 2: 194}
+    assert sorted(power.result()) == list(range(193, 193 + 120))
+    assert device.connections == {1: 193, 2: 194}
+    assert [event.verb for event in events].count("burst") == 1
+
+    with observed.batch() as batch:
+        batch.set_connections({5: 197})
+        batch.disconnect_all()
+    assert device.connections == {}
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.fleet import OxcFleet, _Execution
+
+SLOW = 0.3  # Latency (seconds) of the slow device
+
+
+@pytest.fixture
+def fleet(simulators):
+    simulators.simulators[1].latency = SLOW
+    fast, slow = (Oxc(*address) for address in simulators.addresses)
+    fleet = OxcFleet({"fast": fast, "slow": slow}, deadline=0.1)
+    yield fleet
+    fleet.close()
+    fast.close()
+    slow.close()
+
+
+def test_results_and_errors_are_reported_per_device(fleet):
+    fleet.deadline = None
+    outcome = fleet.connect({"fast": {1: 193}, "slow": {1: "invalid"}})
+    assert outcome.results == {"fast": None}
+    assert list(outcome.errors) == ["slow"]
+    assert fleet.connections().results == {"fast": {1: 193}, "slow": {}}
+    with pytest.raises(KeyError):
+        fleet.disconnect({"unknown": {1: 193}})
+
+
+def test_deadline(fleet):
+    outcome = fleet.idn()
+    assert outcome.timeouts == ["slow"]
+    assert list(outcome.results) == ["fast"]
+    assert outcome.elapsed < SLOW
+
+
+def test_late_devices_are_interrupted_and_reconnected(fleet):
+    slow = fleet.devices["slow"]
+    released = threading.Event()
+
+    def operation(oxc):
+        try:
+            return oxc.idn
+        finally:
+            if oxc is slow:
+                released.set()
+
+    assert fleet.run(operation).timeouts == ["slow"]
+    assert released.wait(SLOW / 2), "worker still busy with the late device"
+
+    fleet.deadline = None
+    assert fleet.run(lambda oxc: oxc.number_of_ports).results == {
+        "fast": (192, 192),
+        "slow": (192, 192),
+    }
+
+
+class LateExecutor(object):
+    """Executor delivering the results long after the calls return"""
+
+    def submit(self, function, *args):
+        future = Future()
+
+        def run():
+            result = function(*args)
+            time.sleep(SLOW)
+            future.set_result(result)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+
+class Device(object):
+    def __init__(self):
+        self.operations = []
+
+    def abort(self):
+        self.operations.append("abort")
+
+    def close(self):
+        self.operations.append("close")
+
+
+def test_calls_finished_before_the_deadline_are_not_aborted():
+    device = Device()
+    execution = _Execution(LateExecutor(), 0.05, {"late": lambda: 1}, {"late": device})
+    assert execution.collect().timeouts == ["late"]
+    assert device.operations == []  # The idle session is still usable
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.instrumentation import LatencyHistogram
+from devicecontrol.polatis.scpi import ScpiEvent
+
+ADDRESS = ("10.0.0.1", 5025)
+
+
+def event(elapsed, verb="*idn?", outcome="ok"):
+    return ScpiEvent(verb, ADDRESS, 14, 40, elapsed, outcome, 0)
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(resolution=0.01)
+    for i in range(1, 101):
+        histogram(event(i / 1000))  # 1ms, 2ms, ..., 100ms
+    histogram(event(1.0, verb=":pmon:pow?", outcome="timeout"))
+
+    summary = histogram.summary()
+    idn = summary[ADDRESS, "*idn?"]
+    assert idn["p50"] == pytest.approx(0.050, rel=0.01)
+    assert idn["p95"] == pytest.approx(0.095, rel=0.01)
+    assert idn["p99"] == pytest.approx(0.099, rel=0.01)
+    assert idn["mean"] == pytest.approx(0.0505)
+    assert (idn["count"], idn["sent"], idn["received"]) == (100, 1400, 4000)
+    assert idn["outcomes"] == {"ok": 100}
+    assert summary[ADDRESS, ":pmon:pow?"]["outcomes"] == {"timeout": 1}
+
+    assert histogram.percentile(ADDRESS, "*idn?", 50) == idn["p50"]
+    assert histogram.percentile(ADDRESS, "*rst", 50) is None
+    histogram.reset()
+    assert histogram.summary() == {}
+
+
+def test_latency_histogram_tiny_latencies_share_the_first_bucket():
+    histogram = LatencyHistogram()
+    histogram(event(0))
+    histogram(event(LatencyHistogram.MIN_LATENCY / 2))
+    assert histogram.percentile(ADDRESS, "*idn?", 99) < 2 * LatencyHistogram.MIN_LATENCY
+
+
+def test_scpi_events_are_reported_per_verb(simulators):
+    events = []
+    oxc = Oxc(*simulators.addresses[0], transport="buffered", observers=[events.append])
+    try:
+        oxc.query("*idn?")
+        oxc.burst([":pmon:pow? (@1)", ":pmon:pow? (@2)"], 2)
+        oxc.burst(["*idn?", ":pmon:pow? (@1)"], 2)
+    finally:
+        oxc.close()
+
+    assert [e.verb for e in events] == ["*idn?", ":pmon:pow?", "burst"]
+    for e in events:
+        assert e.address == oxc.address
+        assert e.sent > 0 and e.received > 0 and e.elapsed > 0
+        assert (e.outcome, e.retries) == ("ok", 0)
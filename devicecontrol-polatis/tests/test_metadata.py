@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import time
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.metadata import METADATA_CACHE, MetadataCache
+
+
+def _idn_queries(address, **kwargs):
+    """Number of ``*idn?`` sent by a new Oxc for finding its number of ports"""
+    sent = []
+    oxc = Oxc(*address, observers=[lambda event: sent.append(event.verb)], **kwargs)
+    assert oxc.number_of_ports == (192, 192)
+    oxc.close()
+    return sent.count("*idn?")
+
+
+def test_metadata_is_shared_by_default(simulators):
+    address = simulators.addresses[0]
+    assert _idn_queries(address) == 1
+    assert _idn_queries(address) == 0
+    assert tuple(METADATA_CACHE.get(address)["number_of_ports"]) == (192, 192)
+    assert _idn_queries(simulators.addresses[1]) == 1
+
+
+def test_metadata_cache_can_be_disabled(simulators):
+    address = simulators.addresses[0]
+    assert _idn_queries(address, metadata_cache=False) == 1
+    assert _idn_queries(address, metadata_cache=False) == 1
+    assert METADATA_CACHE.get(address) is None
+
+
+def test_entries_expire():
+    cache = MetadataCache(ttl=0.05)
+    cache.store(("10.0.0.1", 5025), {"product_code": "x"})
+    assert cache.get(("10.0.0.1", 5025)) == {"product_code": "x"}
+    time.sleep(0.1)
+    assert cache.get(("10.0.0.1", 5025)) is None
+
+
+def test_cache_is_persisted(simulators, tmp_path):
+    path = tmp_path / "metadata.json"
+    address = simulators.addresses[0]
+    assert _idn_queries(address, metadata_cache=MetadataCache(str(path))) == 1
+    assert "{}:{}".format(*address) in json.loads(path.read_text())
+    # A new process (cache) reads the file instead of querying the device
+    assert _idn_queries(address, metadata_cache=MetadataCache(str(path))) == 0
+
+    MetadataCache(str(path)).invalidate(address)
+    assert json.loads(path.read_text()) == {}
+
+
+def test_invalid_files_are_ignored(tmp_path):
+    path = tmp_path / "metadata.json"
+    path.write_text("{not json")
+    cache = MetadataCache(str(path))
+    assert cache.get(("10.0.0.1", 5025)) is None
+    cache.store(("10.0.0.1", 5025), {})
+    assert list(json.loads(path.read_text())) == ["10.0.0.1:5025"]
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from devicecontrol.polatis.monitor import PowerMonitor
+
+
+class ScriptedOxc(object):
+    """Device returning a predefined sequence of power levels"""
+
+    def __init__(self, *readings):
+        self.readings = list(readings)
+
+    def get_power(self, port_list):
+        return dict(zip(port_list, self.readings.pop(0)))
+
+
+def test_ring_buffer_keeps_the_last_samples():
+    oxc = ScriptedOxc([-10, -20], [-11, -20], [-12, -20], [-16, -20], [-13, -21])
+    monitor = PowerMonitor(oxc, ports=[193, 194], history=3)
+    assert monitor.latest() == {}
+    assert math.isnan(monitor.window().mean[193])
+
+    for _ in range(5):
+        monitor.sample()
+
+    assert (len(monitor), monitor.count) == (3, 5)
+    assert monitor.latest() == {193: -13, 194: -21}
+    stats = monitor.window()
+    assert stats.min == {193: -16, 194: -21}
+    assert stats.max == {193: -12, 194: -20}
+    assert stats.mean[193] == pytest.approx(-41 / 3)
+    assert monitor.window(2).max == {193: -13, 194: -20}
+    assert monitor.changed(2.5) == [193]
+    assert monitor.changed(2.5, samples=2) == [193]
+    assert monitor.changed(5) == []
+
+
+def test_failed_samples_are_nan():
+    monitor = PowerMonitor(ScriptedOxc(), ports=[193])
+    with pytest.raises(IndexError):
+        monitor.sample()
+    assert math.isnan(monitor.latest()[193])
+
+
+def test_samples_are_streamed_from_the_device(oxc, device):
+    device.input_power[1] = -3.0
+    oxc.connect({1: 193})
+    ports = list(range(193, 197))
+    with PowerMonitor(oxc, ports=ports, interval=0.01, history=4) as monitor:
+        received = []
+        for timestamp, levels in monitor.samples(timeout=1):
+            received.append((timestamp, list(levels)))
+            if len(received) == 3:
+                break
+    assert [levels[0] for _, levels in received] == [pytest.approx(-4.5)] * 3
+    assert received[0][0] <= received[1][0] <= received[2][0]
+    assert monitor.latest()[194] == pytest.approx(-60)
+
+
+def test_async_iteration(oxc):
+    async def first_samples(monitor):
+        received = []
+        async for _, levels in monitor:
+            received.append(len(levels))
+            if len(received) == 2:
+                break
+        return received
+
+    with PowerMonitor(oxc, ports=[193, 194], interval=0.01) as monitor:
+        assert asyncio.run(first_samples(monitor)) == [2, 2]
+
+
+def test_closing_the_async_iteration_releases_the_executor():
+    monitor = PowerMonitor(ScriptedOxc(), ports=[193])  # No samples arrive
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def consume():
+        async for _ in monitor:
+            pass
+
+    async def cancel_and_reuse_the_executor():
+        asyncio.get_running_loop().set_default_executor(executor)
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        worker = asyncio.get_running_loop().run_in_executor(None, lambda: "free")
+        try:
+            return await asyncio.wait_for(worker, 1)
+        finally:
+            monitor.stop()  # Unblocks the executor, even when failing
+
+    assert asyncio.run(cancel_and_reuse_the_executor()) == "free"
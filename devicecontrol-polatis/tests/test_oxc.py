@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import random
+import socket
+import threading
+import time
+from array import array
+
+import pytest
+
+from devicecontrol.polatis import (
+    Oxc,
+    _ConnectionCache,
+    _decode,
+    _decode_channels,
+    _encode,
+    _encode_channels,
+    _encode_list,
+    _encode_range,
+)
+from devicecontrol.polatis.scpi import ScpiDisconnected
+
+
+@pytest.fixture
+def queries():
+    return []
+
+
+@pytest.fixture
+def cached(simulators, transport, queries):
+    """``Oxc`` in cached mode, recording the messages sent to the device"""
+    oxc = Oxc(
+        *simulators.addresses[0],
+        transport=transport,
+        cache_ttl=60,
+        observers=[lambda event: queries.append(event.verb)],
+    )
+    yield oxc
+    oxc.close()
+
+
+def test_connection_cache_expires_after_ttl():
+    cache = _ConnectionCache(0.05)
+    assert cache.get() is None
+    cache.store({1: 193})
+    assert cache.get() == {1: 193}
+    time.sleep(0.1)
+    assert cache.get() is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_connection_cache_invalidation():
+    cache = _ConnectionCache(60)
+    cache.store({1: 193})
+    cache.invalidate()
+    assert cache.get() is None
+    cache.apply("add", {2: 194})  # Nothing to update without a mirror
+    assert cache.get() is None
+
+
+def test_connection_cache_mirrors_operations():
+    cache = _ConnectionCache(60)
+    cache.store({1: 193, 2: 194})
+    cache.apply("add", {3: 193})  # Output 193 moves to input 3
+    assert cache.get() == {2: 194, 3: 193}
+    cache.apply("sub", {2: 194, 3: 195})  # 3 => 195 does not exist
+    assert cache.get() == {3: 193}
+    cache.apply("only", {4: 196})
+    assert cache.get() == {4: 196}
+
+
+def test_cached_reads_do_not_reach_the_device(cached, device, queries):
+    device.connections.update({1: 193})
+    assert cached.connections == {1: 193}
+    cached.connect({2: 194})
+    cached.disconnect({1: 193})
+    assert cached.connections == {2: 194}
+    assert queries.count("oxc:swit:conn:stat?") == 1
+    assert cached.cache_stats == {"hits": 1, "misses": 1}
+
+    device.connections.clear()  # Changed behind the back of the mirror
+    assert cached.connections == {2: 194}
+    assert cached.refresh() == {}
+    assert cached.connections == {}
+
+
+def test_failed_writes_invalidate_the_cache(cached, queries):
+    cached.connections
+    cached._socket.shutdown(socket.SHUT_RDWR)  # Outcome of the write unknown
+    with pytest.raises(ScpiDisconnected):
+        cached.connect({1: 193})
+    cached.reconnect_session()
+    cached.connections
+    assert queries.count("oxc:swit:conn:stat?") == 2
+
+
+def test_apply_connections_sends_only_the_difference(oxc, device):
+    device.connections.update({1: 193, 2: 194, 3: 195})
+    sent = []
+    oxc.add_observer(lambda event: sent.append(event.verb))
+
+    changes = oxc.apply_connections({1: 193, 2: 196, 4: 197})
+
+    assert changes.added == {2: 196, 4: 197}
+    assert changes.removed == {2: 194, 3: 195}
+    assert changes.unchanged == {1: 193}
+    assert device.connections == {1: 193, 2: 196, 4: 197}
+    assert sent == ["oxc:swit:conn:stat?", "burst"]
+
+
+def test_apply_connections_without_changes_sends_nothing(oxc, device):
+    device.connections.update({1: 193})
+    sent = []
+    oxc.add_observer(lambda event: sent.append(event.verb))
+
+    changes = oxc.apply_connections({"1": "193"})
+
+    assert changes == ({}, {}, {1: 193})
+    assert sent == ["oxc:swit:conn:stat?"]
+
+
+def test_minimal_diff_setter(simulators, device):
+    device.connections.update({1: 193, 2: 194})
+    oxc = Oxc(*simulators.addresses[0], minimal_diff=True, cache_ttl=60)
+    oxc.connections = {1: 193, 3: 195}
+    assert oxc.connections == {1: 193, 3: 195}
+    assert device.connections == {1: 193, 3: 195}
+    oxc.close()
+
+
+@pytest.mark.parametrize(
+    "ports, encoded",
+    [
+        ([], ""),
+        ([5], "5"),
+        ([1, 2], "1,2"),
+        ([1, 2, 3, 4], "1:4"),
+        ([1, 2, 3, 7, 9, 10, 11], "1:3,7,9:11"),
+        ([4, 3, 2, 1], "4,3,2,1"),  # Only ascending runs are compressed
+        (["193", "194", "195"], "193:195"),
+    ],
+)
+def test_encode_channels(ports, encoded):
+    assert _encode_channels(ports) == encoded
+    assert list(_decode_channels(encoded)) == [int(port) for port in ports]
+
+
+@pytest.mark.parametrize(
+    "first, last, encoded", [(3, 3, "3"), (3, 4, "3,4"), (3, 5, "3:5")]
+)
+def test_encode_range(first, last, encoded):
+    assert _encode_range(first, last) == encoded
+
+
+def test_decode_channels_expands_ranges_in_any_direction():
+    assert list(_decode_channels("(@ 1:3, 9:7 ,12)")) == [1, 2, 3, 9, 8, 7, 12]
+
+
+@pytest.mark.parametrize("size", [16, 192, 384])
+def test_connection_codecs_round_trip(size):
+    inputs = list(range(1, size // 2 + 1))
+    contiguous = {i: i + size // 2 for i in inputs}
+    outputs = random.Random(size).sample(sorted(contiguous.values()), len(inputs))
+    shuffled = dict(zip(inputs, outputs))
+    for connection_map in (contiguous, shuffled):
+        assert _decode(_encode(connection_map)) == connection_map
+    assert _encode(contiguous) == "(@1:{}),(@{}:{})".format(
+        size // 2, size // 2 + 1, size
+    )
+
+
+def test_encode_sorts_pairs_and_lists():
+    assert _encode({194: 2, "1": "193"}) == "(@2,1),(@194,193)"
+    assert _encode_list(range(1, 49)) == "(@1:48)"
+
+
+@pytest.mark.parametrize("power_sessions", [1, 3])
+def test_read_power_into_array(simulators, device, power_sessions):
+    device.input_power[1] = -3.0
+    device.connections.update({1: 193})
+    oxc = Oxc(*simulators.addresses[0], power_sessions=power_sessions)
+    ports = list(range(193, 385)) + list(range(1, 193))  # Two chunks
+
+    levels = oxc.read_power(ports)
+    assert len(levels) == len(ports)
+    assert levels[0] == pytest.approx(-4.5)
+    assert levels[1:192] == array("d", [-60.0]) * 191
+    assert list(levels[192:]) == [device.input_power[p] for p in range(1, 193)]
+    assert oxc.get_power([193, 194]) == {193: -4.5, 194: -60.0}
+    oxc.close()
+
+
+@pytest.mark.parametrize("ports, expected", [(50, ["query"]), (384, ["burst"])])
+def test_read_power_uses_bursts_only_for_several_chunks(oxc, ports, expected):
+    oxc.metadata  # Number of ports, for checking the readings
+    sent = []
+
+    def spy(method):
+        original = getattr(oxc, method)
+
+        def call(*args):
+            sent.append(method)
+            return original(*args)
+
+        setattr(oxc, method, call)
+
+    spy("query")
+    spy("burst")
+
+    assert len(oxc.read_power(range(1, ports + 1))) == ports
+    assert sent == expected
+
+
+def test_close_releases_the_power_sessions(simulators):
+    oxc = Oxc(*simulators.addresses[0], power_sessions=2)
+    oxc.read_power(range(1, 385))  # Two chunks
+    lanes = list(oxc._power_lanes)
+    assert len(lanes) == 1 and lanes[0].connected
+
+    oxc.close()
+    assert not any(lane.connected for lane in lanes)
+    deadline = time.monotonic() + 2
+    while any(t.name.startswith("oxc-power") for t in threading.enumerate()):
+        assert time.monotonic() < deadline, "power worker threads leaked"
+        time.sleep(0.01)
+
+    # Still usable: the sessions are opened again on demand
+    assert len(oxc.read_power(range(1, 385))) == 384
+    oxc.close()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from devicecontrol.polatis.oxc_server import (
+    DEVICE_LANES,
+    WarmSessions,
+    make_app,
+    setup_server,
+)
+from devicecontrol.polatis.pool import SESSION_POOL
+
+
+@pytest.fixture(autouse=True)
+def sessions():
+    yield SESSION_POOL
+    SESSION_POOL.clear()
+    DEVICE_LANES.shutdown()
+
+
+@pytest.fixture
+def config(simulators, tmp_path):
+    """Inventory file with the simulated devices (sharing the same ip)"""
+    path = tmp_path / "inventory.json"
+    inventory = {
+        name: {"ip": host, "port": str(port)}
+        for name, (host, port) in zip(["first", "second"], simulators.addresses)
+    }
+    path.write_text(json.dumps(inventory))
+    return str(path)
+
+
+def serve(polatis_dict, test):
+    """Run ``await test(fetch)`` with the app of the inventory listening,
+    ``fetch(path, body=None)`` returning the decoded response
+    """
+
+    async def run():
+        sock, port = bind_unused_port()
+        server = HTTPServer(make_app(polatis_dict))
+        server.add_sockets([sock])
+        client = AsyncHTTPClient()
+
+        async def fetch(path, body=None):
+            response = await client.fetch(
+                "http://127.0.0.1:{}{}".format(port, path),
+                method="GET" if body is None else "POST",
+                body=None if body is None else json.dumps(body),
+            )
+            return response.body if body is None else json.loads(response.body)
+
+        try:
+            return await test(fetch)
+        finally:
+            server.stop()
+
+    return asyncio.run(run())
+
+
+def test_setup_server_loads_the_inventory(config, simulators):
+    polatis_dict = setup_server(config)
+    simulators.devices[1].connections.update({2: 194})
+
+    async def test(fetch):
+        warm = WarmSessions(polatis_dict, interval=0)
+        warm.start()
+        while not all(address in SESSION_POOL for address in simulators.addresses):
+            await asyncio.sleep(0.01)
+        assert warm._callback is None  # Keepalive disabled
+        return await fetch("/connections", {"oxc_name": "second"})
+
+    assert serve(polatis_dict, test) == {"response": {"2": 194}}
+
+
+@pytest.mark.parametrize(
+    "inventory, error",
+    [
+        ([], "must be a JSON object"),
+        ({"a": "10.0.0.1"}, "Device 'a'"),
+        ({"a": {"port": 5025}}, "Device 'a'"),
+        ({"a": {"ip": "10.0.0.1", "port": "scpi"}}, "Device 'a': invalid port 'scpi'"),
+    ],
+)
+def test_setup_server_rejects_invalid_inventories(tmp_path, inventory, error):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(inventory))
+    with pytest.raises(ValueError, match=error):
+        setup_server(str(path))
+
+
+def test_slow_device_does_not_stall_the_others(config, simulators):
+    polatis_dict = setup_server(config)
+    slow, fast = simulators.simulators
+    slow.latency, fast.latency = 1.0, 0.05
+
+    async def test(fetch):
+        loop = asyncio.get_running_loop()
+        slow_request = asyncio.ensure_future(
+            fetch("/connect", {"oxc_name": "first", "connection_dict": {1: 193}})
+        )
+        await asyncio.sleep(0.1)  # The slow device is busy
+        durations = []
+        for path, body in [("/", None), ("/connections", {"oxc_name": "second"})]:
+            start = loop.time()
+            await fetch(path, body)
+            durations.append(loop.time() - start)
+        assert not slow_request.done()
+        return durations, await slow_request
+
+    durations, response = serve(polatis_dict, test)
+    assert response == {"response": "Ok."}
+    assert max(durations) < 0.5  # Within the fast latency (a few round trips)
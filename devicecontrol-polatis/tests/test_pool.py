@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import time
+
+import pytest
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.pool import SessionPool, SessionPoolExhausted
+
+
+def _pool(**kwargs):
+    return SessionPool(
+        factory=lambda host, port: Oxc(host, port, transport="buffered"), **kwargs
+    )
+
+
+def test_same_session_is_reused(simulators):
+    pool = _pool()
+    (host, port), _ = simulators.addresses
+    with pool.session(host, port) as first:
+        first.connect({1: 193})
+    assert pool.call(host, lambda oxc: oxc, port) is first
+    assert (host, port) in pool
+    pool.clear()
+    assert len(pool) == 0
+
+
+def test_least_recently_used_session_is_evicted(simulators):
+    pool = _pool(max_sessions=1)
+    first, second = simulators.addresses
+    with pool.session(*first) as oxc:
+        oxc.sync()
+    pool.call(second[0], lambda oxc: oxc.sync(), port=second[1])
+    assert first not in pool and second in pool
+    assert not oxc.connected
+
+
+def test_idle_sessions_are_evicted(simulators):
+    pool = _pool(idle_timeout=0.05)
+    first, second = simulators.addresses
+    pool.call(first[0], lambda oxc: oxc.sync(), port=first[1])
+    time.sleep(0.1)
+    pool.call(second[0], lambda oxc: oxc.sync(), port=second[1])
+    assert first not in pool and second in pool
+
+
+def test_leased_sessions_are_not_evicted(simulators):
+    pool = _pool(max_sessions=1, wait_timeout=0.05)
+    first, second = simulators.addresses
+    with pool.session(*first) as oxc:
+        with pytest.raises(SessionPoolExhausted):
+            with pool.session(*second):
+                pass
+        pool.evict(*first)
+        oxc.sync()  # Still usable until released
+        assert oxc.connected
+    assert not oxc.connected
+
+
+def test_dropped_connections_are_reestablished(simulators):
+    pool = _pool()
+    host, port = simulators.addresses[0]
+    with pool.session(host, port) as oxc:
+        oxc.sync()
+    oxc._socket.shutdown(socket.SHUT_RDWR)  # As if the device dropped it
+    assert pool.call(host, lambda oxc: oxc.number_of_ports, port) == (192, 192)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import math
+
+import pytest
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.results import ConnectionArray, PortArray, _PortIndexed
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _PortIndexed()
+
+
+def test_port_array_behaves_like_a_dict():
+    power = PortArray.from_mapping({195: -3.5, 193: -1.0})
+    assert power == {193: -1.0, 195: -3.5}
+    assert len(power) == 2 and list(power) == [193, 195]
+    assert power.first == 193 and math.isnan(power.values_array[1])
+    assert 194 not in power and power.get(194) is None
+    with pytest.raises(KeyError):
+        power["193"]
+
+
+def test_slicing():
+    power = PortArray(193, [-1.0, -2.0, -3.0, -4.0])
+    assert power[194:196] == {194: -2.0, 195: -3.0}
+    assert power[:195] == {193: -1.0, 194: -2.0}
+    assert power[300:] == {}
+    with pytest.raises(ValueError):
+        power[193:197:2]
+
+
+def test_diff():
+    before = PortArray(193, [-1.0, -2.0, math.nan])
+    after = PortArray(194, [-2.4, -3.0, -4.0])
+    assert before.diff(after) == [193, 194, 195, 196]
+    assert before.diff(after, tolerance=0.5) == [193, 195, 196]
+    connections = ConnectionArray.from_mapping({1: 193, 2: 194})
+    assert connections.diff({1: 193, 2: 195, 3: 196}) == [2, 3]
+
+
+@pytest.mark.parametrize(
+    "result", [PortArray(193, [-1.0, math.nan, -3.25]), ConnectionArray(1, [193, 0])]
+)
+def test_bytes_round_trip(result):
+    assert type(result).from_bytes(result.to_bytes()) == result
+    other = PortArray if isinstance(result, ConnectionArray) else ConnectionArray
+    with pytest.raises(ValueError):
+        other.from_bytes(result.to_bytes())
+
+
+def test_compact_results_from_the_device(simulators, device):
+    device.connections.update({1: 193})
+    oxc = Oxc(*simulators.addresses[0], compact_results=True)
+    assert isinstance(oxc.connections, ConnectionArray)
+    assert oxc.connections == {1: 193}
+    power = oxc.get_power([193, 194])
+    assert isinstance(power, PortArray) and sorted(power) == [193, 194]
+    oxc.close()
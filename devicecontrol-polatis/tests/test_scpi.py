@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from devicecontrol.polatis import Oxc
+from devicecontrol.polatis.scpi import PRIORITY_HIGH, PRIORITY_NORMAL, RequestQueue
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+class _Holder(threading.Thread):
+    """Thread keeping the turn of a request queue until released"""
+
+    def __init__(self, queue):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.holding = threading.Event()
+        self.release = threading.Event()
+
+    def run(self):
+        with self.queue.slot():
+            self.holding.set()
+            self.release.wait()
+
+    def __enter__(self):
+        self.start()
+        self.holding.wait()
+        return self
+
+    def __exit__(self, *_):
+        self.release.set()
+        self.join()
+
+
+def test_requests_are_served_by_priority_then_fifo():
+    queue, served = RequestQueue(), []
+
+    def request(name, priority):
+        with queue.slot(priority):
+            served.append(name)
+
+    with _Holder(queue):
+        threads = []
+        for name, priority in [
+            ("first", PRIORITY_NORMAL),
+            ("second", PRIORITY_NORMAL),
+            ("urgent", PRIORITY_HIGH),
+        ]:
+            thread = threading.Thread(target=request, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            _wait_for(lambda: len(queue) == len(threads))
+
+    for thread in threads:
+        thread.join()
+    assert served == ["urgent", "first", "second"]
+
+
+def test_slot_is_reentrant():
+    queue = RequestQueue()
+    with queue.slot():
+        with queue.slot(PRIORITY_HIGH):
+            assert len(queue) == 0
+
+
+def test_interrupted_waiters_release_their_ticket(monkeypatch):
+    queue = RequestQueue()
+    with _Holder(queue):
+
+        def interrupted(*_):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(queue._condition, "wait", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            with queue.slot():
+                pass
+        monkeypatch.undo()
+        assert len(queue) == 0
+
+    entered = threading.Event()
+
+    def request():
+        with queue.slot():
+            entered.set()
+
+    threading.Thread(target=request, daemon=True).start()
+    assert entered.wait(1)
+
+
+@pytest.mark.parametrize(
+    "operation, priority",
+    [
+        (lambda oxc: oxc.get_power([193, 194]), PRIORITY_NORMAL),
+        (lambda oxc: oxc.read_power(range(193, 385)), PRIORITY_NORMAL),
+        (lambda oxc: oxc.connect({1: 193}), PRIORITY_HIGH),
+    ],
+    ids=["get_power", "read_power", "connect"],
+)
+def test_burst_priority_depends_on_its_messages(simulators, operation, priority):
+    oxc = Oxc(*simulators.addresses[0], transport="buffered", prioritize_commands=True)
+    oxc.sync()
+    slot, priorities = oxc._requests.slot, []
+
+    def recorded(priority=PRIORITY_NORMAL):
+        priorities.append(priority)
+        return slot(priority)
+
+    oxc._requests.slot = recorded
+    operation(oxc)
+    oxc._requests.slot = slot
+    oxc.close()
+    assert priorities[-1] == priority  # The burst comes last
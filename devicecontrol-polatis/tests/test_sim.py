@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+
+from devicecontrol.polatis.sim import DARK, SimulatedDevice, SimulatedOxc
+
+
+@pytest.fixture
+def sim():
+    device = SimulatedDevice(product_code="N-VST-8x8-LU1-DMHNV-801", seed=1)
+    device.input_power.update({1: -3.0, 2: -5.0})
+    return device
+
+
+def test_scpi_messages(sim):
+    assert sim.handle("*IDN?") == "Polatis,N-VST-8x8-LU1-DMHNV-801,000000,sim"
+    assert sim.handle("*opc?") == "1"
+    assert sim.handle(":oxc:swit:conn:add (@1,2),(@9,10)") is None
+    assert sim.handle("OXC:SWIT:CONN:STAT?") == "(@1,2),(@9,10)"
+    sim.handle("oxc:swit:conn:sub (@2,3),(@10,11)")  # Just existing pairs
+    assert sim.connections == {1: 9}
+    sim.handle("oxc:swit:conn:add (@10),(@1)")  # Pairs are sorted
+    assert sim.connections == {1: 10}
+    sim.handle("oxc:swit:conn:only (@3:4),(@11:12)")
+    assert sim.connections == {3: 11, 4: 12}
+    sim.handle("oxc:swit:disc:all")
+    assert sim.handle("oxc:swit:conn:stat?") == "(@),(@)"
+    assert sim.handle(":syst:comm:netw:addr?").startswith('IPADDR="127.0.0.1"')
+
+
+def test_adding_cross_connects_releases_the_ports(sim):
+    sim.handle("oxc:swit:conn:add (@1,2),(@9,10)")
+    sim.handle("oxc:swit:conn:add (@3),(@9)")
+    assert sim.connections == {2: 10, 3: 9}
+
+
+def test_power_levels(sim):
+    sim.connections.update({1: 9})
+    assert sim.handle(":pmon:pow? (@1,9,10)") == "(-3.00,-4.50,{:.2f})".format(DARK)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "oxc:swit:conn:add (@1),(@2)",  # Input to input
+        "oxc:swit:conn:add (@1,2),(@9)",  # Different sizes
+        "oxc:swit:conn:add (@1),(@17)",  # Out of range
+        "oxc:swit:conn:add (@a),(@9)",
+        "oxc:unknown?",
+    ],
+)
+def test_invalid_messages_have_no_response(sim, message, caplog):
+    assert sim.handle(message) is None
+    assert sim.connections == {}
+    assert caplog.records[-1].levelname == "WARNING"
+
+
+def test_invalid_product_code():
+    with pytest.raises(ValueError):
+        SimulatedDevice(product_code="unknown")
+
+
+def exchange(simulator, payload):
+    """Send the payload to the simulator and time the complete response"""
+
+    async def run():
+        await simulator.start()
+        try:
+            reader, writer = await asyncio.open_connection(*simulator.address)
+            start = time.monotonic()
+            writer.write(payload)
+            lines = [await reader.readline() for _ in payload.splitlines()]
+            elapsed = time.monotonic() - start
+            writer.close()
+            await writer.wait_closed()
+            return lines, elapsed
+        finally:
+            await simulator.stop()
+
+    return asyncio.run(run())
+
+
+def test_latency_is_added_to_each_burst():
+    simulator = SimulatedOxc(latency=0.1)
+    lines, elapsed = exchange(simulator, b"*opc?\n*opc?\n")
+    assert lines == [b"1\r\n", b"1\r\n"]
+    assert 0.1 <= elapsed < 0.19  # Paid once for the whole burst
+
+
+def test_jitter_is_bounded():
+    simulator = SimulatedOxc(latency=0.05, jitter=0.05, seed=1)
+    _, elapsed = exchange(simulator, b"*opc?\n")
+    assert 0.05 <= elapsed < 0.15
@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import io
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from devicecontrol.polatis.slicing import (
+    JsonLinesSink,
+    PortMapping,
+    SliceManager,
+    SliceTrace,
+    VirtualOxc,
+    WriteCoalescer,
+    _RenderedRecord,
+)
+
+
+@pytest.fixture
+def mapping():
+    return PortMapping([5, 3, 9], [200, 195])
+
+
+def test_port_mapping_translations(mapping):
+    assert [mapping.real_port(p) for p in range(1, 6)] == [5, 3, 9, 200, 195]
+    assert [mapping.virtual_port(p) for p in (5, 3, 9, 200, 195)] == [1, 2, 3, 4, 5]
+    assert mapping.real_ports(["1", 4]) == [5, 200]
+    assert mapping.has_pair(3, 195) and not mapping.has_pair(195, 3)
+    assert list(mapping.filter_real_ports([1, 3, 200, 201])) == [3, 200]
+
+
+def test_port_mapping_connections(mapping):
+    real = {3: 195, 9: 300, 7: 200, 5: 200}
+    assert mapping.virtual_connections(real) == {2: 5, 1: 4}
+    assert mapping.filter_connections(real) == ({3: 195, 5: 200}, {9: 300, 7: 200})
+    assert mapping.real_connections({2: 5}) == {3: 195}
+    assert mapping.virtual_values({3: -1.0, 195: -2.0, 4: -3.0}) == {2: -1.0, 5: -2.0}
+
+
+@pytest.mark.parametrize(
+    "method, port, code",
+    [
+        ("real_input", 4, "input-port"),
+        ("real_output", 3, "output-port"),
+        ("virtual_input", 4, "input-port"),
+        ("virtual_output", 5, "output-port"),
+    ],
+)
+def test_port_mapping_errors(mapping, method, port, code):
+    with pytest.raises(ValueError) as error:
+        getattr(mapping, method)(port)
+    assert error.value.args[1] == code
+
+
+class WithoutPowerPorts(object):
+    """Underlay that does not tell which ports have photodetectors"""
+
+    def __init__(self, oxc):
+        self._oxc = oxc
+
+    def __getattr__(self, name):
+        if name == "power_ports":
+            raise AttributeError(name)
+        return getattr(self._oxc, name)
+
+
+@pytest.mark.parametrize("wrapper", [None, WithoutPowerPorts])
+def test_slice_manager_power_sweeps_all_the_slices(oxc, device, wrapper):
+    device.input_power[1] = -3.0
+    device.connections.update({1: 193})
+    underlay = wrapper(oxc) if wrapper else oxc
+    manager = SliceManager(underlay, power_ttl=60)
+    first = manager.add_slice("first", [1, 2], [193, 194])
+    second = manager.add_slice("second", [3], [195])
+
+    assert first.get_power([3]) == {3: pytest.approx(-4.5)}
+    assert second.get_power([2]) == {2: -60.0}  # From the same sweep
+    assert manager.snapshot_stats["power_misses"] == 1
+    assert manager.snapshot_stats["power_hits"] == 1
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class Recorder(object):
+    """Underlay recording the operations, slow to send some ports and
+    rejecting others
+    """
+
+    def __init__(self, slow=(), invalid=(), interrupted=()):
+        self.slow = set(slow)
+        self.invalid = set(invalid)
+        self.interrupted = set(interrupted)
+        self.operations = []
+
+    def connect(self, connection_map):
+        self._record("add", connection_map)
+
+    def disconnect(self, connection_map):
+        self._record("sub", connection_map)
+
+    def _record(self, operation, connection_map):
+        if self.slow.intersection(connection_map.values()):
+            time.sleep(0.2)
+        if self.invalid.intersection(connection_map):
+            raise ValueError("Invalid ports", "port")
+        if self.interrupted.intersection(connection_map):
+            raise Interrupted
+        self.operations.append((operation, dict(connection_map)))
+
+
+def submit_together(coalescer, *operations):
+    futures = [None] * len(operations)
+
+    def submit(index, operation):
+        futures[index] = coalescer.submit(*operation)
+
+    threads = [threading.Thread(target=submit, args=o) for o in enumerate(operations)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+def test_write_coalescer_merges_disjoint_operations():
+    underlay = Recorder()
+    coalescer = WriteCoalescer(underlay, window=0.1)
+    submit_together(coalescer, ("add", {1: 193}), ("add", {2: 194}), ("sub", {3: 195}))
+    assert underlay.operations == [("sub", {3: 195}), ("add", {1: 193, 2: 194})]
+    assert coalescer.stats == {"calls": 3, "bursts": 1, "splits": 0}
+
+
+def test_write_coalescer_keeps_the_order_of_conflicting_batches():
+    underlay = Recorder(slow=[193])
+    coalescer = WriteCoalescer(underlay, window=0.01)
+    first = threading.Thread(target=coalescer.connect, args=({1: 193},))
+    first.start()
+    time.sleep(0.05)  # The first batch is being sent
+    coalescer.connect({1: 194})
+    first.join()
+    assert underlay.operations == [("add", {1: 193}), ("add", {1: 194})]
+
+
+def test_write_coalescer_reports_errors_per_call():
+    underlay = Recorder(invalid=[99])
+    coalescer = WriteCoalescer(underlay, window=0.1)
+    futures = submit_together(coalescer, ("add", {1: 193}), ("add", {99: 194}))
+    outcomes = {tuple(f.exception().args) if f.exception() else None for f in futures}
+    assert outcomes == {None, ("Invalid ports", "port")}
+    assert underlay.operations == [("add", {1: 193})]
+    assert coalescer.stats == {"calls": 2, "bursts": 3, "splits": 1}
+
+
+def test_write_coalescer_resolves_all_the_calls_when_interrupted():
+    underlay = Recorder(invalid=[99], interrupted=[1])
+    coalescer = WriteCoalescer(underlay, window=0.1)
+    futures = submit_together(coalescer, ("add", {1: 193}), ("add", {99: 194}))
+    assert all(future.done() for future in futures)
+    assert isinstance(futures[0].exception(), Interrupted)
+
+
+def test_nested_slices_are_flattened_onto_the_device(oxc, device):
+    parent = VirtualOxc(oxc, [11, 12, 13], [200, 201])
+    child = VirtualOxc(parent, [2, 3], [5])
+
+    assert child.parent is parent and child._underlay is oxc
+    assert child.mapping.real_ports([1, 2, 3]) == [12, 13, 201]
+    assert str(child).endswith("/11,12,13|200,201/2,3|5>")
+
+    child.connect({2: 3})
+    assert device.connections[13] == 201
+    assert child.connections == {2: 3} and parent.connections == {3: 5}
+    child.disconnect({2: 3})
+    assert 13 not in device.connections
+
+
+@pytest.mark.parametrize(
+    "inputs, outputs, code", [([4], [5], "input-port"), ([1], [3], "output-port")]
+)
+def test_nested_slices_are_validated_against_the_parent(oxc, inputs, outputs, code):
+    parent = VirtualOxc(oxc, [11, 12, 13], [200, 201])
+    with pytest.raises(ValueError) as error:
+        VirtualOxc(parent, inputs, outputs)
+    assert error.value.args[1] == code
+
+
+@pytest.fixture
+def manager(oxc, device):
+    device.connections.update({1: 193, 3: 195})
+    manager = SliceManager(oxc, snapshot_ttl=60)
+    manager.add_slice("first", [1, 2], [193, 194])
+    manager.add_slice("second", [3], [195])
+    return manager
+
+
+def test_slice_manager_shares_a_snapshot(manager, oxc):
+    sent = []
+    oxc.add_observer(lambda event: sent.append(event.verb))
+    assert manager["first"].connections == {1: 3}
+    assert manager["second"].connections == {1: 2}
+    assert sent == ["oxc:swit:conn:stat?"]
+    assert manager.snapshot_stats["misses"] == 1
+    assert manager.snapshot_stats["hits"] == 1
+
+    assert manager.connections() == {"first": {1: 3}, "second": {1: 2}}
+    assert sent.count("oxc:swit:conn:stat?") == 2  # Refreshed
+
+
+def test_slice_manager_writes_through_the_snapshot(manager, device):
+    first = manager["first"]
+    first.connections  # Snapshot taken
+    first.connect({2: 4})
+    first.disconnect({1: 3})
+    assert device.connections == {2: 194, 3: 195}
+    assert first.connections == {2: 4}
+    assert manager.snapshot_stats["misses"] == 1
+
+
+@pytest.mark.parametrize(
+    "name, inputs, outputs, code",
+    [
+        ("third", [3], [196], "overlapping-ports"),
+        ("third", [4], [194], "overlapping-ports"),
+        ("third", [4, 4], [196], "overlapping-ports"),
+        ("first", [4], [196], "slice-name"),
+    ],
+)
+def test_slice_manager_rejects_overlapping_slices(manager, name, inputs, outputs, code):
+    with pytest.raises(ValueError) as error:
+        manager.add_slice(name, inputs, outputs)
+    assert error.value.args[1] == code
+    assert len(manager) == 2
+
+
+def test_slice_manager_remove_slice_releases_its_ports(manager, device):
+    assert manager.owner(3) == "second"
+    manager.remove_slice("second")
+    assert manager.owner(3) is None and manager.owner(195) is None
+    assert list(manager) == ["first"]
+    assert manager.add_slice("third", [3], [195, 196]).connections == {1: 2}
+    assert device.connections[3] == 195  # Cross-connects are kept
+
+
+class Records(logging.Handler):
+    """Handler keeping the log records, without formatting them"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("tests.slicing.trace")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = Records()
+    logger.addHandler(handler)
+    yield logger
+    logger.removeHandler(handler)
+
+
+def test_slice_trace_writes_json_lines(oxc, logger):
+    stream = io.StringIO()
+    trace = SliceTrace([JsonLinesSink(stream)], logger=logger)
+    virtual = VirtualOxc(oxc, [1, 2], [193, 194], trace=trace)
+    virtual.connect({1: 3})
+    virtual.connections
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [r["operation"] for r in records] == ["connect", "connections"]
+    assert records[0]["node"] == str(virtual)
+    assert records[0]["real"] == {"1": 193} and records[0]["virtual"] == {"1": 3}
+    assert records[1]["virtual"] == {"1": 3}
+    assert not logger.handlers[0].records  # DEBUG is not enabled
+
+
+def test_slice_trace_sample_rate_drops_records(monkeypatch, logger):
+    records = []
+    trace = SliceTrace([records.append], sample_rate=0.25, logger=logger)
+    draws = iter([0.1, 0.3, 0.9, 0.2])
+    monkeypatch.setattr("random.random", lambda: next(draws))
+    for i in range(4):
+        trace("connect", "node", {i: 193}, {i: 3})
+    assert [dict(r.real) for r in records] == [{0: 193}, {3: 193}]
+
+
+def test_slice_trace_renders_the_debug_text_lazily(monkeypatch, logger):
+    monkeypatch.setattr(logger, "handlers", logger.handlers[:1])  # Not pytest's
+    rendered = []
+    render = _RenderedRecord.__str__
+    monkeypatch.setattr(
+        _RenderedRecord, "__str__", lambda self: rendered.append(1) or render(self)
+    )
+    trace = SliceTrace(logger=logger)
+    trace("connect", "node", {1: 193}, {1: 3})
+    assert not trace.enabled and not logger.handlers[0].records
+
+    logger.setLevel(logging.DEBUG)
+    trace("connect", "node", {1: 193}, {1: 3})
+    (record,) = logger.handlers[0].records
+    assert isinstance(record.args[0], _RenderedRecord)
+    assert not rendered  # Just when the record is formatted
+    text = record.getMessage()
+    assert rendered and "Real device:" in text and "Virtual device:" in text
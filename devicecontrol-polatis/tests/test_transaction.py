@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+
+from devicecontrol.polatis.transaction import Transaction, TransactionFailed
+
+
+def test_net_change_is_applied(oxc, device):
+    device.connections.update({1: 193, 2: 194})
+    with Transaction(oxc) as transaction:
+        transaction.disconnect({1: 193})
+        transaction.connect({1: 195, 3: 193})
+        transaction.disconnect({3: 193})
+        assert len(transaction) == 3
+
+    report = transaction.report
+    assert device.connections == {1: 195, 2: 194}
+    assert report.before == {1: 193, 2: 194}
+    assert report.after == {1: 195, 2: 194}
+    assert report.added == {1: 195}
+    assert report.removed == {1: 193}
+    assert not report.rolled_back
+    assert set(report.timings) == {"snapshot", "apply", "verify", "rollback"}
+
+
+def test_failed_verification_rolls_back(oxc, device):
+    device.connections.update({1: 193})
+    add = device._handlers["oxc:swit:conn:add"]
+
+    def faulty_add(args):
+        """The device does not establish the cross-connects of input 2"""
+        add(args)
+        device.connections.pop(2, None)
+
+    device._handlers["oxc:swit:conn:add"] = faulty_add
+
+    with pytest.raises(TransactionFailed) as failure:
+        with Transaction(oxc) as transaction:
+            transaction.disconnect({1: 193})
+            transaction.connect({1: 194, 2: 195})
+
+    report = failure.value.report
+    assert failure.value.expected == {1: 194, 2: 195}
+    assert report.rolled_back
+    assert report.after == report.before == {1: 193}
+    assert device.connections == {1: 193}
+    assert report.timings["rollback"] > 0
+
+
+def test_errors_while_applying_roll_back(oxc, device):
+    device.connections.update({1: 193})
+    transaction = Transaction(oxc)
+    transaction.connect({1: 194})
+    result = oxc._connection_result
+
+    def fail_once(connections):
+        """Fails between the burst and the verification"""
+        oxc._connection_result = result
+        raise ZeroDivisionError
+
+    oxc._connection_result = fail_once
+
+    with pytest.raises(ZeroDivisionError):
+        transaction.commit()
+    assert device.connections == {1: 193}
+    assert transaction.report is None
+
+
+def test_operations_are_discarded_on_errors(oxc, device):
+    with pytest.raises(RuntimeError):
+        with Transaction(oxc) as transaction:
+            transaction.connect({1: 193})
+            raise RuntimeError
+    assert len(transaction) == 0
+    assert device.connections == {}
+
+
+class NamedPort(object):
+    """OXC whose address has a named port (e.g. a service name)"""
+
+    def __init__(self, oxc):
+        self._oxc = oxc
+
+    @property
+    def address(self):
+        return self._oxc.address[0], "scpi"
+
+    def __getattr__(self, name):
+        return getattr(self._oxc, name)
+
+
+def test_rollback_failures_are_logged_with_named_ports(oxc, device, caplog):
+    transaction = Transaction(NamedPort(oxc))
+    transaction.connect({1: 194})
+
+    def fail(connections):
+        raise ZeroDivisionError
+
+    oxc._connection_result = fail  # Both the apply and the rollback fail
+
+    with pytest.raises(ZeroDivisionError):
+        transaction.commit()
+    assert "Rollback of transaction in OXC 127.0.0.1:scpi failed" in caplog.text
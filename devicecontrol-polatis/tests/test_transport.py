@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import threading
+
+import pytest
+
+from devicecontrol.polatis.transport import BufferedSession
+
+
+class SmallSession(BufferedSession):
+    BUFFER_SIZE = 16
+
+
+@pytest.fixture
+def sockets():
+    """Pair of connected sockets: (device side, session side)"""
+    pair = socket.socketpair()
+    yield pair
+    for sock in pair:
+        sock.close()
+
+
+@pytest.fixture
+def peer(sockets):
+    return sockets[0]
+
+
+@pytest.fixture
+def session(sockets):
+    return SmallSession(sockets[1], timeout=0.5)
+
+
+def test_marker_split_across_reads(peer, session):
+    peer.sendall(b"first\r")
+    timer = threading.Timer(0.05, peer.sendall, [b"\nsecond\r\n"])
+    timer.start()
+    assert session.expect_exact("\r\n") == 0
+    assert session.before == b"first"
+    timer.join()
+    session.expect_exact(b"\r\n")
+    assert session.before == b"second"
+
+
+def test_buffer_grows_for_large_responses(peer, session):
+    response = b"x" * (10 * SmallSession.BUFFER_SIZE)
+    peer.sendall(response + b"\r\nnext")
+    session.expect_exact("\r\n")
+    assert session.before == response
+    assert len(session._buffer) > SmallSession.BUFFER_SIZE
+
+
+def test_data_is_kept_after_a_timeout(peer, session):
+    session.timeout = 0.05
+    peer.sendall(b"partial")
+    with pytest.raises(socket.timeout):
+        session.expect_exact("\r\n")
+    peer.sendall(b" end\r\n")
+    session.expect_exact("\r\n")
+    assert session.before == b"partial end"
+
+
+def test_before_is_released_on_the_next_call(peer, session):
+    peer.sendall(b"a\r\nb\r\n")
+    session.expect_exact("\r\n")
+    before = session.before
+    session.expect_exact("\r\n")
+    with pytest.raises(ValueError):
+        bytes(before)
+    assert session.before == b"b"
+
+
+def test_eof(peer, session):
+    peer.sendall(b"last")
+    peer.close()
+    with pytest.raises(EOFError):
+        session.expect_exact("\r\n")
+
+
+def test_sendline(peer, session):
+    session.sendline("*idn?")
+    assert peer.recv(16) == b"*idn?\n"